@@ -0,0 +1,145 @@
+from threading import Lock
+from time import monotonic
+
+from nio.properties import PropertyHolder, BoolProperty, FloatProperty, \
+    ObjectProperty, TimeDeltaProperty
+
+from .query_updates import remap
+
+
+class AdaptiveSchedule(object):
+
+    """ Polling interval of each query, derived from its post velocity.
+
+    After every poll of a query its rate of fresh posts is folded into an
+    exponentially weighted average, and the query is next due once it is
+    expected to have `target_posts` new posts. Intervals are kept between
+    `min_interval` and `max_interval` seconds, and a query that returned
+    nothing has its interval doubled.
+
+    """
+
+    def __init__(self, n_queries, min_interval, max_interval,
+                 target_posts=20, smoothing=0.5):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.target_posts = target_posts
+        self.smoothing = smoothing
+        self._interval = [min_interval] * n_queries
+        self._rate = [None] * n_queries
+        self._polled_at = [None] * n_queries
+        self._due_at = [0] * n_queries
+        self._lock = Lock()
+
+    def due(self, idx, now=None):
+        now = monotonic() if now is None else now
+        return now >= self._due_at[idx]
+
+    def interval(self, idx):
+        return self._interval[idx]
+
+    def observe(self, idx, fresh_posts, now=None):
+        """ Record a finished poll of a query and schedule its next one.
+
+        Args:
+            idx (int): index of the polled query.
+            fresh_posts (int): number of fresh posts the poll found.
+
+        """
+        now = monotonic() if now is None else now
+        with self._lock:
+            polled_at = self._polled_at[idx]
+            elapsed = self._interval[idx] if polled_at is None \
+                else max(now - polled_at, 1e-3)
+            rate = fresh_posts / elapsed
+            if self._rate[idx] is not None:
+                rate = self.smoothing * rate + \
+                    (1 - self.smoothing) * self._rate[idx]
+            if fresh_posts == 0:
+                interval = self._interval[idx] * 2
+            elif rate > 0:
+                interval = self.target_posts / rate
+            else:
+                interval = self.max_interval
+            interval = min(self.max_interval, max(self.min_interval, interval))
+            self._rate[idx] = rate
+            self._interval[idx] = interval
+            self._polled_at[idx] = now
+            self._due_at[idx] = now + interval
+
+    def reindex(self, old_idxs):
+        """ Remap the schedule to changed queries, see `remap`. Added
+        queries are due right away.
+
+        """
+        with self._lock:
+            self._interval = remap(self._interval, old_idxs,
+                                   self.min_interval)
+            self._rate = remap(self._rate, old_idxs)
+            self._polled_at = remap(self._polled_at, old_idxs)
+            self._due_at = remap(self._due_at, old_idxs, 0)
+
+
+class AdaptiveOptions(PropertyHolder):
+    enabled = BoolProperty(title='Enabled', default=False)
+    min_interval = TimeDeltaProperty(title='Min Query Interval',
+                                     default={"seconds": 20})
+    max_interval = TimeDeltaProperty(title='Max Query Interval',
+                                     default={"seconds": 3600})
+    target_posts = FloatProperty(title='Target Posts per Poll', default=20)
+
+
+class AdaptiveScheduling(object):
+
+    """ Block mixin that polls each query at its own adaptive interval.
+
+    When enabled, `polling_interval` becomes the tick of the scheduler:
+    every tick only the queries that are due are polled, so quiet
+    queries are polled less and the request budget goes to busy ones.
+
+    """
+
+    adaptive_polling = ObjectProperty(AdaptiveOptions,
+                                      title='Adaptive Polling')
+
+    def __init__(self):
+        super().__init__()
+        self._schedule = None
+        self._fresh_counts = [0]
+
+    def configure(self, context):
+        super().configure(context)
+        self._fresh_counts = [0] * self._n_queries
+        options = self.adaptive_polling()
+        if not options.enabled():
+            self._schedule = None
+            return
+        self._schedule = AdaptiveSchedule(
+            self._n_queries,
+            options.min_interval().total_seconds(),
+            options.max_interval().total_seconds(),
+            options.target_posts())
+
+    def _query_ready(self, idx):
+        return super()._query_ready(idx) and \
+            (self._schedule is None or self._schedule.due(idx))
+
+    def _count_fresh_posts(self, count):
+        self._fresh_counts[self._idx] += count
+
+    def _schedule_next_poll(self):
+        """ Call once the current query has no more pages to fetch. """
+        fresh_posts = self._fresh_counts[self._idx]
+        self._fresh_counts[self._idx] = 0
+        if self._schedule is not None:
+            self._schedule.observe(self._idx, fresh_posts)
+            self.logger.debug(
+                "Next poll of {} in {:.0f}s after {} fresh posts".format(
+                    self.current_query,
+                    self._schedule.interval(self._idx), fresh_posts))
+
+    def _reindex_queries(self, old_idxs):
+        super()._reindex_queries(old_idxs)
+        self._fresh_counts = remap(self._fresh_counts, old_idxs, 0)
+        if self._schedule is not None:
+            self._schedule.reindex(old_idxs)
@@ -0,0 +1,216 @@
+import asyncio
+import json
+from contextvars import copy_context
+from enum import Enum
+from threading import Thread
+
+from nio.properties import SelectProperty
+
+
+class PollingBackend(Enum):
+    threads = 'threads'
+    asyncio = 'asyncio'
+
+
+class AsyncResponse(object):
+
+    """ A buffered aiohttp response.
+
+    Exposes the parts of the `requests.Response` interface that the
+    blocks use, so `_process_response` works the same on either backend.
+
+    """
+
+    def __init__(self, status_code, headers, content):
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+
+    def json(self):
+        return json.loads(self.content.decode('utf-8'))
+
+    def iter_content(self, chunk_size=1):
+        for start in range(0, len(self.content), chunk_size):
+            yield self.content[start:start + chunk_size]
+
+    def close(self):
+        pass
+
+
+class AsyncPolling(object):
+
+    """ Block mixin that runs every query on a single asyncio event loop.
+
+    With the `asyncio` polling backend, each poll runs one cycle over all
+    ready queries as tasks on an event loop owned by the block. Paging
+    chains and retry timers are tasks on the same loop, so thousands of
+    queries share one thread, and `max_concurrency` bounds the requests
+    in flight rather than the number of threads.
+
+    Blocks split `_prepare_url` into `_prepare_query` for blocking work
+    and `_build_url`, which must not block the event loop.
+
+    Requires aiohttp, and builds on the ConcurrentPolling, HTTPSession,
+    ConditionalRequests and RateLimitBudget mixins. aiohttp is only
+    imported by blocks using this backend.
+
+    """
+
+    polling_backend = SelectProperty(PollingBackend, title='Polling Backend',
+                                     default=PollingBackend.threads)
+
+    def __init__(self):
+        super().__init__()
+        self._loop = None
+        self._loop_thread = None
+        self._async_session = None
+        self._async_semaphore = None
+        self._async_cycle = None
+
+    def configure(self, context):
+        super().configure(context)
+        if self._async_backend():
+            try:
+                import aiohttp  # noqa
+            except ImportError:
+                raise ImportError(
+                    "The asyncio polling backend requires aiohttp")
+
+    def start(self):
+        if self._async_backend():
+            self._start_event_loop()
+        super().start()
+
+    def stop(self):
+        super().stop()
+        if self._loop is not None:
+            self._stop_event_loop()
+
+    def poll(self, paging=False, *args, **kwargs):
+        if paging or self._loop is None:
+            return super().poll(paging, *args, **kwargs)
+        if self._async_cycle is not None and not self._async_cycle.done():
+            self.logger.warning(
+                "Previous polling cycle is still running, skipping poll")
+            return
+        self._async_cycle = asyncio.run_coroutine_threadsafe(
+            self._poll_cycle_async(), self._loop)
+
+    def _async_backend(self):
+        return self.polling_backend() == PollingBackend.asyncio
+
+    def _start_event_loop(self):
+        self._loop = asyncio.new_event_loop()
+        self._loop_thread = Thread(target=self._loop.run_forever, daemon=True)
+        self._loop_thread.start()
+        asyncio.run_coroutine_threadsafe(
+            self._open_async_session(), self._loop).result()
+
+    def _stop_event_loop(self):
+        if self._async_cycle is not None:
+            self._async_cycle.cancel()
+        asyncio.run_coroutine_threadsafe(
+            self._async_session.close(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._loop_thread.join()
+        self._loop.close()
+        self._loop = None
+
+    async def _open_async_session(self):
+        import aiohttp
+        options = self.http_options()
+        self._async_semaphore = asyncio.Semaphore(self.max_concurrency())
+        self._async_session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(
+                limit=options.pool_size(),
+                force_close=not options.keep_alive()),
+            timeout=aiohttp.ClientTimeout(
+                total=options.timeout().total_seconds()),
+            headers={'Accept-Encoding': 'gzip, deflate'
+                     if options.compression() else 'identity'})
+
+    async def _poll_cycle_async(self):
+        """ Asyncio counterpart of `_poll_concurrently`. """
+        # Held by the event loop thread for the whole cycle.
+        if not self._cycle_lock.acquire(blocking=False):
+            return
+        try:
+            batches = await asyncio.gather(*[
+                self._poll_query_async(idx)
+                for idx in self._queries_to_poll()])
+            signals = [s for batch in batches for s in batch]
+            self.logger.debug("Polled {} queries, got {} signals".format(
+                len(batches), len(signals)))
+            if signals:
+                self.notify_signals(signals)
+        finally:
+            self._cycle_lock.release()
+
+    async def _poll_query_async(self, idx):
+        """ Asyncio counterpart of `_poll_query`. """
+        signals = []
+        with self._query_scope(idx):
+            try:
+                paging = self._resume_paging()
+                while True:
+                    self.page_num += 1
+                    await self._prepare_url_async(paging)
+                    resp = await self._get_async(self.url)
+                    if resp is None:
+                        break
+                    if resp.status_code not in (200, 304):
+                        self._query_failed(resp)
+                        self.logger.error(
+                            "Polling request of {} returned status {}".format(
+                                self.url, resp.status_code))
+                        break
+                    page_signals, paging = self._process_response(resp)
+                    self._include_query(page_signals)
+                    signals.extend(page_signals)
+                    if not paging:
+                        break
+            except Exception:
+                self._query_failed()
+                self.logger.exception(
+                    "Failed to poll query: {}".format(self.current_query))
+        return signals
+
+    async def _prepare_url_async(self, paging=False):
+        """ Asyncio counterpart of `_prepare_url`.
+
+        Blocking query preparation runs in the default executor, in the
+        context of the current query, and budget is awaited.
+
+        """
+        if not paging:
+            context = copy_context()
+            await asyncio.get_running_loop().run_in_executor(
+                None, context.run, self._prepare_query)
+        await self._wait_for_budget(paging)
+        self._build_url(paging)
+
+    async def _get_async(self, url):
+        """ GET a url, retrying errors and rate limiting on the event loop.
+
+        Returns:
+            resp (AsyncResponse): the last response, or None if no request
+                got a response.
+
+        """
+        resp = None
+        for attempt in range(self.retry_limit() + 1):
+            if attempt:
+                await asyncio.sleep(self.retry_interval().total_seconds())
+            try:
+                headers = self._conditional_headers(url)
+                async with self._async_semaphore:
+                    async with self._async_session.get(
+                            url, headers=headers) as raw:
+                        resp = AsyncResponse(
+                            raw.status, raw.headers, await raw.read())
+            except Exception as e:
+                self.logger.warning("GET request failed: {}".format(e))
+                continue
+            if resp.status_code < 500 and resp.status_code != 429:
+                break
+        return resp
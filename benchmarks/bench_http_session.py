@@ -0,0 +1,89 @@
+""" Per-request latency of bare requests.get vs the pooled block session.
+
+Serves a recorded-size tag media page from a local keep-alive HTTP stub
+and times sequential GETs, the way a block pages through `next_url`.
+
+Run from the blocks directory:
+
+    python -m instagram.benchmarks.bench_http_session [n_requests]
+
+"""
+import json
+import sys
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from threading import Thread
+
+import requests
+
+from ..http_session import build_session
+
+
+PAGE = json.dumps({
+    "pagination": {"next_url": "/v1/tags/nio/media/recent?max_tag_id=1",
+                   "min_tag_id": "1"},
+    "meta": {"code": 200},
+    "data": [{"id": str(i), "type": "image", "tags": ["nio"],
+              "caption": {"text": "post {}".format(i)}} for i in range(33)]
+}).encode()
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(PAGE)))
+        self.end_headers()
+        self.wfile.write(PAGE)
+
+    def log_message(self, *args):
+        pass
+
+
+class _StubServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+def _time_requests(get, url, n):
+    latencies = []
+    for _ in range(n):
+        start = time.perf_counter()
+        get(url).content
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    return latencies
+
+
+def _report(name, latencies):
+    mean = sum(latencies) / len(latencies)
+    p50 = latencies[len(latencies) // 2]
+    p99 = latencies[int(len(latencies) * 0.99) - 1]
+    print("{:<16} mean {:7.3f} ms  p50 {:7.3f} ms  p99 {:7.3f} ms".format(
+        name, mean * 1000, p50 * 1000, p99 * 1000))
+    return mean
+
+
+def main(n=500):
+    server = _StubServer(("127.0.0.1", 0), _StubHandler)
+    Thread(target=server.serve_forever, daemon=True).start()
+    url = "http://127.0.0.1:{}/v1/tags/nio/media/recent".format(
+        server.server_address[1])
+    try:
+        bare = _report("requests.get", _time_requests(requests.get, url, n))
+        session = build_session()
+        pooled = _report("pooled session",
+                         _time_requests(session.get, url, n))
+        session.close()
+        print("pooled session is {:.1f}x faster per request".format(
+            bare / pooled))
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
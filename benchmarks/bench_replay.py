@@ -0,0 +1,178 @@
+""" Polling throughput of every block class on replayed API transcripts.
+
+Each scenario configures one block class against a local stub server
+replaying a recorded transcript (see `replay.py`) and times full polling
+cycles with `concurrent_polling`. Cursors are rewound before every cycle
+so each one replays the whole transcript. Scenarios run in their own
+process, so peak RSS is per scenario.
+
+Run from the blocks directory:
+
+    python -m instagram.benchmarks.bench_replay [--cycles N]
+        [--properties JSON] [--save FILE] [--compare FILE]
+
+`--save` writes the results as a baseline, and `--compare` exits with
+status 1 if a metric regressed by more than `--tolerance` against one.
+
+"""
+import argparse
+import json
+import logging
+import resource
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from unittest.mock import patch
+
+from nio.testing.block_test_case import NIOBlockTestCase
+
+from ..rest_polling.rest_block import RESTPolling
+from ..instagram_block import Instagram
+from ..instagram_search_by_location import InstagramSearchByLocation
+from ..instagram_search_by_radius import InstagramSearchByRadius
+from ..instagram_search_by_user_block import InstagramSearchByUser
+from .replay import ReplayServer, Transcript, replay_block_class
+
+
+SCENARIOS = {
+    # 8 hashtags, each following a chain of 15 pages
+    "tag": (Instagram, "replay_tag.json", {
+        "queries": ["tag_{}".format(i) for i in range(8)],
+    }),
+    # 8 user timelines of 2 pages, one private and one failing user
+    "user": (InstagramSearchByUser, "replay_user.json", {
+        "queries": ["user_{}".format(i) for i in range(8)] +
+        ["private_user", "failing_user"],
+    }),
+    "location": (InstagramSearchByLocation, "replay_location.json", {
+        "queries": ["10000{}".format(i) for i in range(6)],
+    }),
+    "radius": (InstagramSearchByRadius, "replay_radius.json", {
+        "queries": [
+            {"latitude": 39.74, "longitude": -104.99, "radius": 1000},
+            {"latitude": 39.75, "longitude": -104.98, "radius": 1000},
+            {"latitude": 39.73, "longitude": -105.00, "radius": 2000},
+            {"latitude": 40.02, "longitude": -105.27, "radius": 1500},
+        ],
+    }),
+}
+
+# Metrics where a larger value is a regression
+HIGHER_IS_WORSE = ("requests_per_cycle", "p50_cycle_ms", "p99_cycle_ms",
+                   "peak_rss_mb")
+
+
+class _Harness(NIOBlockTestCase):
+
+    def runTests(self):
+        pass
+
+
+def _percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+def _rewind(blk):
+    """ Make the next cycle find every replayed post fresh again. """
+    if hasattr(blk, "lookback"):
+        blk._freshest = [0] * blk._n_queries
+
+
+def run_scenario(name, cycles=20, properties=None):
+    block_class, transcript, scenario_properties = SCENARIOS[name]
+    logging.disable(logging.CRITICAL)
+    harness = _Harness()
+    harness.setUp()
+    with ReplayServer(Transcript.load(transcript)) as server, \
+            patch.object(RESTPolling, "_authenticate"):
+        blk = replay_block_class(block_class, server.url)()
+        harness.configure_block(blk, dict(
+            scenario_properties, concurrent_polling=True,
+            **(properties or {})))
+        if isinstance(blk, Instagram):
+            blk._initialize_all_min_tag_ids()
+        notified = []
+        blk.notify_signals = lambda signals, *args: \
+            notified.append(len(signals))
+        server.requests = 0
+        latencies = []
+        for _ in range(cycles):
+            _rewind(blk)
+            start = time.perf_counter()
+            blk.poll()
+            latencies.append(time.perf_counter() - start)
+        blk.stop()
+    harness.tearDown()
+    return {
+        "signals_per_sec": sum(notified) / sum(latencies),
+        "requests_per_cycle": server.requests / cycles,
+        "p50_cycle_ms": _percentile(latencies, 0.5) * 1000,
+        "p99_cycle_ms": _percentile(latencies, 0.99) * 1000,
+        # ru_maxrss is in kilobytes on Linux
+        "peak_rss_mb": resource.getrusage(
+            resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+
+def compare(results, baseline, tolerance):
+    """ Describe every metric that is worse than the baseline.
+
+    Returns:
+        regressions (list(str))
+
+    """
+    regressions = []
+    for name, metrics in results.items():
+        for metric, value in metrics.items():
+            base = baseline.get(name, {}).get(metric)
+            if not base:
+                continue
+            change = (value - base) / base
+            if metric not in HIGHER_IS_WORSE:
+                change = -change
+            if change > tolerance:
+                regressions.append("{} {}: {:.1f} -> {:.1f} ({:+.0%})".format(
+                    name, metric, base, value, (value - base) / base))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("scenarios", nargs="*", default=sorted(SCENARIOS))
+    parser.add_argument("--cycles", type=int, default=20)
+    parser.add_argument("--properties", type=json.loads, default={},
+                        help="block properties to add to every scenario")
+    parser.add_argument("--save", help="write the results to this file")
+    parser.add_argument("--compare", help="baseline results to check")
+    parser.add_argument("--tolerance", type=float, default=0.1)
+    args = parser.parse_args(argv)
+
+    results = {}
+    print("{:<10} {:>12} {:>12} {:>10} {:>10} {:>10}".format(
+        "scenario", "signals/sec", "req/cycle", "p50 ms", "p99 ms",
+        "RSS MB"))
+    for name in args.scenarios:
+        with ProcessPoolExecutor(max_workers=1) as executor:
+            metrics = executor.submit(
+                run_scenario, name, args.cycles, args.properties).result()
+        results[name] = metrics
+        print("{:<10} {signals_per_sec:>12.0f} {requests_per_cycle:>12.1f} "
+              "{p50_cycle_ms:>10.1f} {p99_cycle_ms:>10.1f} "
+              "{peak_rss_mb:>10.1f}".format(name, **metrics))
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print("REGRESSION", regression)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,67 @@
+""" Signal construction throughput and memory on recorded API responses.
+
+Compares copying every post field onto a plain Signal against wrapping
+the decoded post in an InstagramSignal, with and without a field
+whitelist.
+
+Run from the blocks directory:
+
+    python -m instagram.benchmarks.bench_signals [repeat]
+
+"""
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+from nio.signal.base import Signal
+
+from ..instagram_signal import InstagramSignal
+
+
+DATA = os.path.join(os.path.dirname(__file__), "data")
+
+
+def load_posts(name="tag_media_recent.json"):
+    """ Decoded posts of every page of a recorded transcript. """
+    with open(os.path.join(DATA, name)) as f:
+        return [post for page in json.load(f) for post in page["data"]]
+
+
+def _throughput(build, posts, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        [build(post) for post in posts]
+    return len(posts) * repeat / (time.perf_counter() - start)
+
+
+def _bytes_per_signal(build, posts):
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    signals = [build(post) for post in posts]
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    allocated = sum(stat.size_diff for stat in
+                    after.compare_to(before, "filename"))
+    del signals
+    return allocated / len(posts)
+
+
+def main(repeat=200):
+    posts = load_posts()
+    fields = frozenset(["id", "link", "user", "created_time"])
+    builders = [
+        ("Signal(post)", Signal),
+        ("InstagramSignal", InstagramSignal),
+        ("InstagramSignal[4]", lambda post: InstagramSignal(post, fields)),
+    ]
+    print("{} recorded posts, {} repeats".format(len(posts), repeat))
+    for name, build in builders:
+        print("{:<20} {:>10.0f} signals/sec {:>8.0f} bytes/signal".format(
+            name, _throughput(build, posts, repeat),
+            _bytes_per_signal(build, posts)))
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,130 @@
+""" Startup time of every block class, from import to polling every query.
+
+For each scenario of `bench_replay`, a fresh interpreter times the
+import of the block module, then blocks are configured and started
+against the replay stub, whose responses are delayed by `--latency` to
+stand in for the round trips to the API. Reported per block:
+
+- import: cold import of the block module.
+- configure, start: time spent in `configure` and `start`.
+- ready: from `configure` until every query can be polled.
+
+Search blocks run with and without `background_warm_up`. Each block gets
+its own id cache file, so every block resolves its queries like the
+first block of a service would.
+
+Run from the blocks directory:
+
+    python -m instagram.benchmarks.bench_startup [--blocks N]
+        [--latency SECONDS]
+
+"""
+import argparse
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from unittest.mock import patch
+
+from ..rest_polling.rest_block import RESTPolling
+from .bench_replay import SCENARIOS, _Harness
+from .replay import ReplayServer, Transcript, replay_block_class
+
+IMPORT_SCRIPT = """\
+import time
+start = time.perf_counter()
+import {}
+print(time.perf_counter() - start)
+"""
+
+
+def time_import(module):
+    """ Seconds to import `module` in a new interpreter. """
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+    out = subprocess.check_output(
+        [sys.executable, "-c", IMPORT_SCRIPT.format(module)], env=env)
+    return float(out)
+
+
+def _ready(blk):
+    return blk._n_queries > 0 and all(
+        blk._query_ready(idx) for idx in range(blk._n_queries))
+
+
+def run_scenario(name, n_blocks=10, latency=0.05, warm_up=False,
+                 timeout=60):
+    block_class, transcript, properties = SCENARIOS[name]
+    if warm_up:
+        properties = dict(properties, background_warm_up=True)
+    logging.disable(logging.CRITICAL)
+    harness = _Harness()
+    harness.setUp()
+    configure, start, ready = [], [], []
+    with ReplayServer(Transcript.load(transcript), latency) as server, \
+            patch.object(RESTPolling, "_authenticate"), \
+            tempfile.TemporaryDirectory() as cache_dir:
+        replay_class = replay_block_class(block_class, server.url)
+        blocks = []
+        for idx in range(n_blocks):
+            blk = replay_class()
+            blk.notify_signals = lambda *args: None
+            cache = os.path.join(cache_dir, "{}.json".format(idx))
+            began = time.perf_counter()
+            harness.configure_block(blk, dict(
+                properties, id_cache={"file": cache}))
+            configured = time.perf_counter()
+            blk.start()
+            started = time.perf_counter()
+            configure.append(configured - began)
+            start.append(started - configured)
+            blocks.append((blk, began))
+        deadline = time.perf_counter() + timeout
+        for blk, began in blocks:
+            while not _ready(blk) and time.perf_counter() < deadline:
+                time.sleep(0.001)
+            ready.append(time.perf_counter() - began)
+        for blk, _ in blocks:
+            blk.stop()
+    harness.tearDown()
+    return {
+        "configure_ms": sum(configure) / n_blocks * 1000,
+        "start_ms": sum(start) / n_blocks * 1000,
+        "ready_ms": sum(ready) / n_blocks * 1000,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("scenarios", nargs="*", default=sorted(SCENARIOS))
+    parser.add_argument("--blocks", type=int, default=10,
+                        help="blocks configured per scenario")
+    parser.add_argument("--latency", type=float, default=0.05,
+                        help="seconds to delay every stub response by")
+    args = parser.parse_args(argv)
+
+    print("{:<10} {:<8} {:>10} {:>12} {:>10} {:>10}".format(
+        "scenario", "warm-up", "import ms", "configure ms", "start ms",
+        "ready ms"))
+    for name in args.scenarios:
+        block_class = SCENARIOS[name][0]
+        import_ms = time_import(block_class.__module__) * 1000
+        modes = [False]
+        if "background_warm_up" in dir(block_class):
+            modes.append(True)
+        for warm_up in modes:
+            with ProcessPoolExecutor(max_workers=1) as executor:
+                metrics = executor.submit(
+                    run_scenario, name, args.blocks, args.latency,
+                    warm_up).result()
+            print("{:<10} {:<8} {:>10.1f} {configure_ms:>12.1f} "
+                  "{start_ms:>10.1f} {ready_ms:>10.1f}".format(
+                      name, "on" if warm_up else "off", import_ms,
+                      **metrics))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
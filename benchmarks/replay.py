@@ -0,0 +1,155 @@
+""" Replay recorded Instagram API transcripts from a local stub server.
+
+A transcript maps request paths to the pages served for them:
+
+    {"routes": {
+        "/v1/tags/*/media/recent": {"file": "tag_media_recent.json",
+                                    "repeat": 3},
+        "/v1/users/search?q=user_0": [{"data": [...]}],
+        "/v1/users/900/media/recent": [{"status": 400, "body": {...}}]
+    }}
+
+Route keys are matched against the request path with `fnmatch`, plus any
+query parameters they name. Each route is a list of pages, or a recorded
+file of pages to repeat. A page is a response body served with status
+200, or a `status` and `body` pair. The stub points `next_url` of every
+page but the last at the next page, so blocks follow the whole chain.
+
+"""
+import json
+import os
+import time
+from copy import deepcopy
+from fnmatch import fnmatch
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from threading import Lock, Thread
+from urllib.parse import parse_qsl, urlsplit
+
+DATA = os.path.join(os.path.dirname(__file__), "data")
+API_URL = "https://api.instagram.com"
+
+NOT_FOUND = {"meta": {"code": 404, "error_type": "APINotFoundError",
+                      "error_message": "no route in transcript"}}
+
+
+def load_json(name):
+    with open(os.path.join(DATA, name)) as f:
+        return json.load(f)
+
+
+class Transcript(object):
+
+    """ The recorded responses of one benchmark scenario. """
+
+    def __init__(self, routes):
+        self._routes = []
+        for key, pages in routes.items():
+            path, _, query = key.partition("?")
+            if isinstance(pages, dict):
+                pages = load_json(pages["file"]) * pages.get("repeat", 1)
+            self._routes.append((path, dict(parse_qsl(query)), pages))
+
+    @classmethod
+    def load(cls, name):
+        return cls(load_json(name)["routes"])
+
+    def response(self, path, params):
+        """ The status and body to serve for a request.
+
+        Args:
+            path (str): the request path.
+            params (dict): the query parameters of the request.
+
+        Returns:
+            status (int)
+            body (dict)
+            next_page (int): index of the next page, None on the last.
+
+        """
+        for route, route_params, pages in self._routes:
+            if fnmatch(path, route) and all(
+                    fnmatch(params.get(name, ""), value)
+                    for name, value in route_params.items()):
+                break
+        else:
+            return 404, NOT_FOUND, None
+        idx = min(int(params.get("page", 0)), len(pages) - 1)
+        page = pages[idx]
+        next_page = idx + 1 if idx + 1 < len(pages) else None
+        if "status" in page and "body" in page:
+            return page["status"], page["body"], next_page
+        return 200, page, next_page
+
+
+class _ReplayHandler(BaseHTTPRequestHandler):
+
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        url = urlsplit(self.path)
+        params = dict(parse_qsl(url.query))
+        status, body, next_page = self.server.transcript.response(
+            url.path, params)
+        if "pagination" in body:
+            body = deepcopy(body)
+            body["pagination"].pop("next_url", None)
+            if next_page is not None:
+                body["pagination"]["next_url"] = "{}{}?page={}".format(
+                    self.server.url, url.path, next_page)
+        payload = json.dumps(body).encode()
+        self.server.count_request()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+class ReplayServer(ThreadingMixIn, HTTPServer):
+
+    """ Local keep-alive HTTP server replaying a transcript.
+
+    Use as a context manager; `url` replaces the api host in block urls
+    and `requests` counts the requests served. Every response is delayed
+    by `latency` seconds, to stand in for the round trip to the API.
+
+    """
+
+    daemon_threads = True
+
+    def __init__(self, transcript, latency=0):
+        super().__init__(("127.0.0.1", 0), _ReplayHandler)
+        self.transcript = transcript
+        self.latency = latency
+        self.url = "http://127.0.0.1:{}".format(self.server_address[1])
+        self.requests = 0
+        self._lock = Lock()
+
+    def count_request(self):
+        with self._lock:
+            self.requests += 1
+
+    def __enter__(self):
+        Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
+        self.server_close()
+
+
+def replay_block_class(block_class, url):
+    """ A subclass of a block that sends its requests to `url`. """
+    attrs = {}
+    for name in ("URL_FORMAT", "RESOURCE_URL_FORMAT"):
+        value = getattr(block_class, name, None)
+        if value is not None:
+            attrs[name] = value.replace(API_URL, url)
+    return type(block_class.__name__, (block_class,), attrs)
@@ -0,0 +1,285 @@
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar
+from threading import Lock
+
+from nio.properties import BoolProperty, IntProperty
+
+
+def _query_values(obj):
+    context = obj.__dict__.get('_query_context')
+    return context.get() if context is not None else None
+
+
+class _QueryLocal(object):
+
+    """ Block attribute that becomes local to a query worker.
+
+    Outside of a worker the attribute behaves like a plain instance
+    attribute. While a worker (a thread or an asyncio task) is polling a
+    query, reads and writes go to that worker's own copy, so the
+    RESTPolling accessors that index per-query lists by `_idx`
+    (min_tag_id, freshest, ...) keep working.
+
+    """
+
+    def __init__(self, name, default=None):
+        self._name = name
+        self._key = '_shared{}'.format(name)
+        self._default = default
+
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            return self
+        values = _query_values(obj)
+        if values is not None:
+            return values.get(self._name, self._default)
+        return obj.__dict__.get(self._key, self._default)
+
+    def __set__(self, obj, val):
+        values = _query_values(obj)
+        if values is not None:
+            values[self._name] = val
+        else:
+            obj.__dict__[self._key] = val
+
+
+class PollSkipped(Exception):
+
+    """ Raised while preparing a request to leave the current query until
+    the next poll, without counting a failure.
+
+    """
+
+
+class ConcurrentPolling(object):
+
+    """ Block mixin for polling every query in parallel.
+
+    RESTPolling rotates through its queries one at a time, so each query
+    is refreshed once every `n_queries` polling intervals. When
+    `concurrent_polling` is enabled, every poll instead fetches all
+    queries (and their pages) in parallel, bounded by `max_concurrency`,
+    and notifies the results of the whole cycle as one list of signals.
+
+    Each query keeps its own cursor since the per-query state is still
+    looked up through `_idx`, which is local to the worker.
+    Requests are sent with `_fetch_page`, which defaults to `_http_get`
+    (see HTTPSession), whether polling concurrently or one query at a
+    time.
+
+    """
+
+    concurrent_polling = BoolProperty(title='Concurrent Polling',
+                                      default=False)
+    max_concurrency = IntProperty(title='Max Concurrent Requests', default=8)
+
+    _idx = _QueryLocal('_idx', 0)
+    url = _QueryLocal('url')
+    page_num = _QueryLocal('page_num', 1)
+
+    def __init__(self):
+        self._query_context = ContextVar('query_context', default=None)
+        self._cycle_lock = Lock()
+        super().__init__()
+
+    def poll(self, paging=False, in_retry=False):
+        if paging or in_retry:
+            # Pages and retries continue with the current query.
+            return super().poll(paging, in_retry)
+        if self.concurrent_polling():
+            return self._poll_concurrently()
+        if self._select_ready_query():
+            return super().poll(self._resume_paging(), in_retry)
+
+    def _locked_poll(self, paging=False, in_retry=False):
+        """ Overridden from RESTPolling to request the current query with
+        `_fetch_page` rather than a bare `requests.get`.
+
+        """
+        self.page_num = self.page_num + 1 if paging else 1
+        try:
+            headers = self._prepare_url(paging)
+        except PollSkipped as e:
+            self._query_skipped(e)
+            return
+        try:
+            resp = self._fetch_page(self.url, headers=headers)
+        except Exception as e:
+            self.logger.error("GET request failed: {}".format(e))
+            self._query_failed()
+            self._retry(paging)
+            return
+        try:
+            if resp.status_code not in (200, 304):
+                self._on_failure(resp, paging, self.url)
+            else:
+                self._on_success(resp, paging)
+        finally:
+            # Hand streamed connections back to the pool.
+            resp.close()
+
+    def _query_ready(self, idx):
+        """ Override to hold back queries that are still initializing. """
+        return True
+
+    def _query_failed(self, resp=None):
+        """ Override to track failed polls of the current query. """
+        pass
+
+    def _query_skipped(self, reason):
+        """ Override to track polls of the current query skipped with
+        PollSkipped.
+
+        """
+        self.logger.warning("Skipping poll of {}: {}".format(
+            self.current_query, reason))
+
+    def _prepare_query(self):
+        """ Override for blocking work due before the next request of the
+        current query, such as initializing its cursor.
+
+        """
+        pass
+
+    def _resume_paging(self):
+        """ Override to continue a paging chain of the current query.
+
+        Returns:
+            paging (bool): True if `url` was set to the next page.
+
+        """
+        return False
+
+    def _reindex_queries(self, old_idxs):
+        """ Override to remap per-query state after the queries changed.
+
+        Args:
+            old_idxs (list): for each query, its index before the change
+                or None if it was added, see QueryUpdates.
+
+        """
+        idx = self._idx
+        self._idx = old_idxs.index(idx) if idx in old_idxs else 0
+
+    def _select_ready_query(self):
+        """ Move `_idx` to the next query that is ready to be polled.
+
+        Returns:
+            ready (bool): False when no query is ready yet.
+
+        """
+        with self._poll_lock:
+            for offset in range(self._n_queries):
+                idx = (self._idx + offset) % self._n_queries
+                if self._query_ready(idx):
+                    self._idx = idx
+                    return True
+        return False
+
+    def _poll_concurrently(self):
+        """ Poll every query once and notify a single batch of signals.
+
+        A cycle that starts while the previous one is still running is
+        skipped rather than queued, so slow cycles never pile up.
+
+        """
+        if self._n_queries == 0:
+            return
+        if not self._cycle_lock.acquire(blocking=False):
+            self.logger.warning(
+                "Previous polling cycle is still running, skipping poll")
+            return
+        try:
+            batches = self._map_queries(
+                self._poll_query, self._queries_to_poll())
+            signals = [s for batch in batches for s in batch]
+            self.logger.debug("Polled {} queries, got {} signals".format(
+                len(batches), len(signals)))
+            if signals:
+                self.notify_signals(signals)
+        finally:
+            self._cycle_lock.release()
+
+    def _queries_to_poll(self):
+        """ Indexes of the queries to fetch during a concurrent cycle. """
+        return [idx for idx in range(self._n_queries)
+                if self._query_ready(idx)]
+
+    @contextmanager
+    def _query_scope(self, idx):
+        """ Make `idx` the current query of the calling thread or task. """
+        token = self._query_context.set(
+            {'_idx': idx, 'url': None, 'page_num': 0})
+        try:
+            yield
+        finally:
+            self._query_context.reset(token)
+
+    def _map_queries(self, target, idxs):
+        """ Call `target` once per query index, in parallel.
+
+        Args:
+            target (callable): called with no arguments while the query is
+                the current query of the worker thread.
+            idxs (list(int)): query indexes to run `target` for.
+
+        Returns:
+            results (list): the return value of each call, in order.
+
+        """
+        def run(idx):
+            with self._query_scope(idx):
+                return target()
+
+        idxs = list(idxs)
+        workers = max(1, min(self.max_concurrency(), len(idxs)))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(run, idxs))
+
+    def _poll_query(self):
+        """ Fetch the current query and follow its paging chain.
+
+        Returns:
+            signals (list(Signal)): every signal built for the query.
+
+        """
+        signals = []
+        try:
+            paging = self._resume_paging()
+            while True:
+                self.page_num += 1
+                headers = self._prepare_url(paging)
+                resp = self._fetch_page(self.url, headers=headers)
+                if resp is None:
+                    break
+                if resp.status_code not in (200, 304):
+                    self._query_failed(resp)
+                    self.logger.error(
+                        "Polling request of {} returned status {}".format(
+                            self.url, resp.status_code))
+                    break
+                try:
+                    page_signals, paging = self._process_response(resp)
+                finally:
+                    # Hand streamed connections back to the pool.
+                    resp.close()
+                self._include_query(page_signals)
+                signals.extend(page_signals)
+                if not paging:
+                    break
+        except PollSkipped as e:
+            self._query_skipped(e)
+        except Exception:
+            self._query_failed()
+            self.logger.exception(
+                "Failed to poll query: {}".format(self.current_query))
+        return signals
+
+    def _fetch_page(self, url, **kwargs):
+        return self._http_get(url, **kwargs)
+
+    def _include_query(self, signals):
+        if self.include_query():
+            for signal in signals:
+                setattr(signal, self.include_query(), self.current_query)
@@ -0,0 +1,113 @@
+from collections import OrderedDict
+from hashlib import blake2b
+from threading import Lock
+
+from nio.properties import BoolProperty
+
+from .query_updates import remap
+
+
+class ValidatorCache(object):
+
+    """ The cache validators the api last sent for each url.
+
+    Keeps the `ETag` and `Last-Modified` headers of the most recently
+    requested `max_size` urls, evicting the least recently used.
+
+    """
+
+    def __init__(self, max_size=1024):
+        self.max_size = max_size
+        self._validators = OrderedDict()
+        self._lock = Lock()
+
+    def headers(self, url):
+        """ The conditional request headers for a url, if any. """
+        with self._lock:
+            validators = self._validators.get(url)
+            if validators is None:
+                return {}
+            self._validators.move_to_end(url)
+        etag, last_modified = validators
+        headers = {}
+        if etag is not None:
+            headers['If-None-Match'] = etag
+        if last_modified is not None:
+            headers['If-Modified-Since'] = last_modified
+        return headers
+
+    def update(self, url, headers):
+        """ Store the validators from the headers of a response to url. """
+        etag = headers.get('ETag')
+        last_modified = headers.get('Last-Modified')
+        if etag is None and last_modified is None:
+            return
+        with self._lock:
+            self._validators[url] = (etag, last_modified)
+            self._validators.move_to_end(url)
+            while len(self._validators) > self.max_size:
+                self._validators.popitem(last=False)
+
+
+class ConditionalRequests(object):
+
+    """ Block mixin that avoids reprocessing queries that did not change.
+
+    When enabled, polling requests carry the validators of the last
+    response to the same url, so the api can answer 304 Not Modified
+    without a body. A first page whose body hashes the same as the
+    previous first page of its query is skipped too, since all of its
+    posts were handled on the previous poll. Streamed responses are not
+    hashed.
+
+    Blocks return `_conditional_headers(self.url)` from `_prepare_url`,
+    and call `_response_unchanged` before decoding a response, which
+    also stores the validators it carries.
+
+    """
+
+    conditional_requests = BoolProperty(title='Conditional Requests',
+                                        default=False)
+
+    def __init__(self):
+        super().__init__()
+        self._validators = None
+        self._page_digests = []
+
+    def configure(self, context):
+        super().configure(context)
+        self._page_digests = [None] * self._n_queries
+        self._validators = ValidatorCache() \
+            if self.conditional_requests() else None
+
+    def _reindex_queries(self, old_idxs):
+        super()._reindex_queries(old_idxs)
+        self._page_digests = remap(self._page_digests, old_idxs)
+
+    def _conditional_headers(self, url):
+        if self._validators is None:
+            return {}
+        return self._validators.headers(url)
+
+    def _store_validators(self, url, resp):
+        if self._validators is not None and resp is not None:
+            self._validators.update(url, getattr(resp, 'headers', None) or {})
+
+    def _response_unchanged(self, resp):
+        """ Whether a response has nothing new for the current query.
+
+        Returns:
+            unchanged (bool): True for a 304, or for a first page that
+                hashes the same as the last first page of the query.
+
+        """
+        self._store_validators(self.url, resp)
+        if resp.status_code == 304:
+            return True
+        if self._validators is None or self.page_num != 1 or \
+                self.stream_responses():
+            return False
+        digest = blake2b(resp.content, digest_size=16).digest()
+        unchanged = digest == self._page_digests[self._idx]
+        self._page_digests[self._idx] = digest
+        return unchanged
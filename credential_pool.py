@@ -0,0 +1,127 @@
+from collections import OrderedDict
+from hashlib import blake2b
+from threading import Lock
+from time import monotonic
+
+from nio.properties import ListProperty, TimeDeltaProperty
+from nio.types import StringType
+
+
+# Instagram error types of a client id it does not accept
+INVALID_CLIENT_ERRORS = ('OAuthParameterException', 'OAuthClientException')
+# How long a client id that was refused is left out
+INVALID_CLIENT_COOLDOWN = 24 * 3600
+
+
+def _score(key, client_id):
+    digest = blake2b('{}\n{}'.format(key, client_id).encode(),
+                     digest_size=8).digest()
+    return int.from_bytes(digest, 'big')
+
+
+class CredentialPool(object):
+
+    """ Assign queries to client ids, moving them off benched ones.
+
+    Each query ranks every client id by rendezvous hashing on its key, and
+    is assigned the first client id in its ranking that is not benched.
+    Assignments are stable across restarts, spread evenly, and adding a
+    client id or benching one only moves the queries that it gains or
+    loses. Once a client id is back its queries return to it.
+
+    """
+
+    def __init__(self, client_ids, cooldown=300):
+        self.client_ids = [client_id for client_id
+                           in OrderedDict.fromkeys(client_ids) if client_id]
+        self.cooldown = cooldown
+        self._rankings = {}
+        self._benched_until = {}
+        self._lock = Lock()
+
+    def assign(self, key, now=None):
+        """ The client id to send the requests of a query with. """
+        ranking = self._rankings.get(key)
+        if ranking is None:
+            ranking = sorted(self.client_ids, reverse=True,
+                             key=lambda client_id: _score(key, client_id))
+            self._rankings[key] = ranking
+        now = monotonic() if now is None else now
+        benched_until = self._benched_until
+        for client_id in ranking:
+            if benched_until.get(client_id, 0) <= now:
+                return client_id
+        # Every client id is benched, use the one back first.
+        return min(ranking, key=benched_until.get, default=None)
+
+    def bench(self, client_id, seconds=None, now=None):
+        """ Leave a client id out for `seconds`, `cooldown` by default. """
+        now = monotonic() if now is None else now
+        until = now + (self.cooldown if seconds is None else seconds)
+        with self._lock:
+            self._benched_until[client_id] = max(
+                until, self._benched_until.get(client_id, 0))
+
+
+class CredentialSharding(object):
+
+    """ Block mixin that shards queries across a pool of client ids.
+
+    The block's own client id and those in `client_id_pool` are shared
+    between the queries with a CredentialPool, so the rate limit of each
+    client id only caps the queries assigned to it. A client id that is
+    rate limited is benched for `credential_cooldown`, and one that is
+    refused for a day, while its queries move to other client ids.
+
+    Blocks implement `_default_client_id` and send requests with
+    `_client_id`.
+
+    """
+
+    client_id_pool = ListProperty(StringType, title='Additional Client IDs',
+                                  default=[])
+    credential_cooldown = TimeDeltaProperty(
+        title='Rate Limited Client ID Cooldown', default={"seconds": 300})
+
+    def __init__(self):
+        super().__init__()
+        self._credentials = None
+
+    def configure(self, context):
+        super().configure(context)
+        self._credentials = CredentialPool(
+            [self._default_client_id()] + list(self.client_id_pool()),
+            self.credential_cooldown().total_seconds())
+
+    def _default_client_id(self):
+        raise NotImplementedError
+
+    def _client_ids(self):
+        return self._credentials.client_ids
+
+    def _client_id(self, query=None):
+        """ The client id of a query, the current query by default. """
+        query = self.current_query if query is None else query
+        return self._credentials.assign(str(query).lower())
+
+    def _query_failed(self, resp=None):
+        super()._query_failed(resp)
+        status = getattr(resp, 'status_code', None)
+        if status == 429:
+            seconds = None
+        elif status == 400 and self._client_refused(resp):
+            seconds = INVALID_CLIENT_COOLDOWN
+        else:
+            return
+        client_id = self._client_id()
+        self._credentials.bench(client_id, seconds)
+        self.logger.warning(
+            "Client id ...{} returned status {}, benching it".format(
+                client_id[-4:], status))
+
+    def _client_refused(self, resp):
+        try:
+            meta = resp.json().get('meta', {})
+        except Exception:
+            return False
+        return meta.get('error_type') in INVALID_CLIENT_ERRORS
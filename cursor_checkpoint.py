@@ -0,0 +1,65 @@
+class CursorCheckpoint(object):
+
+    """ Block mixin that persists the polling cursor of every query.
+
+    Blocks list their per-query cursor attributes in `CURSOR_FIELDS`,
+    each a list indexed like `queries`. The cursors are saved through the
+    Persistence mixin, which should follow this mixin in the bases,
+    keyed by normalized query so that they survive reordering, adding
+    and removing queries. Saving only builds a small dict, so it is cheap
+    enough to run on every `backup_interval` as well as on stop.
+
+    """
+
+    CURSOR_FIELDS = ()
+
+    def __init__(self):
+        super().__init__()
+        self._persisted_cursors = {}
+
+    def persisted_values(self):
+        """Persist query cursors using block mixin."""
+        return ["_cursors"]
+
+    @property
+    def _cursors(self):
+        """ Cursor fields of every query, keyed by normalized query. """
+        cursors = self._all_cursors()
+        if self._queries_deferred():
+            # No query was applied yet, keep every persisted cursor.
+            return cursors
+        return {key: cursors[key] for key in self._cursor_keys()
+                if key in cursors}
+
+    @_cursors.setter
+    def _cursors(self, cursors):
+        self._persisted_cursors = cursors or {}
+
+    def _all_cursors(self):
+        """ The persisted cursors, updated with those of every query. """
+        cursors = dict(self._persisted_cursors)
+        for idx, key in enumerate(self._cursor_keys()):
+            cursor = {field: getattr(self, field)[idx]
+                      for field in self.CURSOR_FIELDS}
+            if any(value is not None for value in cursor.values()):
+                cursors[key] = cursor
+        return cursors
+
+    def _checkpoint_cursors(self):
+        """ Remember the current cursors, so that queries added later on
+        resume from them like they would after a restart.
+
+        """
+        self._persisted_cursors = self._all_cursors()
+
+    def _queries_deferred(self):
+        """ Override while the queries to poll are not known yet. """
+        return False
+
+    def _cursor_keys(self):
+        return [str(query).lower() for query in self.queries()]
+
+    def _persisted_cursor(self, idx, field):
+        """ The persisted value of a cursor field for a query, if any. """
+        key = self._cursor_keys()[idx]
+        return self._persisted_cursors.get(key, {}).get(field)
@@ -0,0 +1,180 @@
+import hashlib
+import math
+from abc import ABC, abstractmethod
+from enum import Enum
+from threading import Lock
+from time import time
+
+from nio.properties import PropertyHolder, BoolProperty, IntProperty, \
+    SelectProperty, TimeDeltaProperty, ObjectProperty
+
+
+class _RotatingIndex(ABC):
+
+    """ Remembers recently seen keys in two generations.
+
+    New keys go into the current generation. Once it holds `capacity`
+    keys, or `window` seconds have passed, it becomes the previous
+    generation and the oldest generation is forgotten. A key is therefore
+    remembered for at least one full generation and memory never grows
+    past two generations.
+
+    """
+
+    def __init__(self, capacity, window=None):
+        self.capacity = capacity
+        self.window = window
+        self._current = self._new_generation()
+        self._previous = self._new_generation()
+        self._count = 0
+        self._rotated_at = time()
+        self._lock = Lock()
+
+    def add(self, key):
+        """ Remember `key`.
+
+        Returns:
+            new (bool): False if `key` was already seen.
+
+        """
+        with self._lock:
+            self._maybe_rotate()
+            if self._contains(self._current, key) or \
+                    self._contains(self._previous, key):
+                return False
+            self._add(self._current, key)
+            self._count += 1
+            return True
+
+    def _maybe_rotate(self):
+        expired = self.window and time() - self._rotated_at >= self.window
+        if self._count >= self.capacity or expired:
+            self._previous = self._current
+            self._current = self._new_generation()
+            self._count = 0
+            self._rotated_at = time()
+
+    @abstractmethod
+    def _new_generation(self):
+        """ An empty generation. """
+
+    @abstractmethod
+    def _contains(self, generation, key):
+        """ Whether `key` was added to `generation`. """
+
+    @abstractmethod
+    def _add(self, generation, key):
+        """ Add `key` to `generation`. """
+
+
+class SeenSet(_RotatingIndex):
+
+    """ Exact index of seen keys backed by two rotating sets. """
+
+    def _new_generation(self):
+        return set()
+
+    def _contains(self, generation, key):
+        return key in generation
+
+    def _add(self, generation, key):
+        generation.add(key)
+
+
+class SeenBloomFilter(_RotatingIndex):
+
+    """ Approximate index of seen keys backed by two rotating Bloom filters.
+
+    Uses a fixed amount of memory per generation no matter how long the
+    keys are, at the cost of dropping about `error_rate` of unseen keys
+    as false positives.
+
+    """
+
+    def __init__(self, capacity, window=None, error_rate=0.001):
+        self._bits = max(8, int(math.ceil(
+            -capacity * math.log(error_rate) / math.log(2) ** 2)))
+        self._hashes = max(1, int(round(self._bits / capacity * math.log(2))))
+        super().__init__(capacity, window)
+
+    def _new_generation(self):
+        return bytearray((self._bits + 7) // 8)
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(str(key).encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self._bits for i in range(self._hashes)]
+
+    def _contains(self, generation, key):
+        return all(generation[pos >> 3] & (1 << (pos & 7))
+                   for pos in self._positions(key))
+
+    def _add(self, generation, key):
+        for pos in self._positions(key):
+            generation[pos >> 3] |= 1 << (pos & 7)
+
+
+class DedupMode(Enum):
+    exact = 'exact'
+    bloom = 'bloom'
+
+
+class DedupOptions(PropertyHolder):
+    enabled = BoolProperty(title='Enabled', default=False)
+    mode = SelectProperty(DedupMode, title='Index Type',
+                          default=DedupMode.exact)
+    capacity = IntProperty(title='Posts per Generation', default=100000)
+    window = TimeDeltaProperty(title='Generation Window',
+                               default={"seconds": 3600})
+
+
+class PostDeduplication(object):
+
+    """ Block mixin that drops posts already seen by any query.
+
+    A post tagged with several watched hashtags, or inside several
+    overlapping search areas, is only notified the first time it is seen.
+    Posts are keyed on their `id` in a bounded rotating index, and the
+    posts dropped are counted as `duplicates` in the metrics of the query
+    that returned them, see PollingInstrumentation.
+
+    """
+
+    deduplication = ObjectProperty(DedupOptions, title='Deduplication')
+
+    def __init__(self):
+        super().__init__()
+        self._seen_posts = None
+
+    def configure(self, context):
+        super().configure(context)
+        options = self.deduplication()
+        if not options.enabled():
+            self._seen_posts = None
+            return
+        index = SeenBloomFilter if options.mode() == DedupMode.bloom \
+            else SeenSet
+        self._seen_posts = index(options.capacity(),
+                                 options.window().total_seconds())
+
+    def _drop_duplicate_posts(self, posts):
+        """ Filter out posts whose id was already seen.
+
+        Args:
+            posts (list(dict)): decoded posts from an api response.
+
+        Returns:
+            posts (list(dict)): the posts that were not seen before.
+
+        """
+        if self._seen_posts is None:
+            return posts
+        fresh = [p for p in posts if p.get('id') is None or
+                 self._seen_posts.add(p['id'])]
+        dropped = len(posts) - len(fresh)
+        if dropped:
+            self._count('duplicates', dropped)
+            self.logger.debug("Dropped {} duplicate posts of {}".format(
+                dropped, self.current_query))
+        return fresh
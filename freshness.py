@@ -0,0 +1,20 @@
+def split_fresh(posts, freshest, field='created_time'):
+    """ Split out the posts created after `freshest`.
+
+    Creation times are compared as integer unix times, as the api sends
+    them, without building a datetime per post.
+
+    Args:
+        posts (list(dict)): decoded posts, e.g. one page of a response or
+            several pages of the same query.
+        freshest (int): creation time of the freshest post seen so far.
+        field (str): the post field holding its creation time.
+
+    Returns:
+        fresh (list(dict)): the posts newer than `freshest`, in order.
+        freshest (int): the new high-water mark.
+
+    """
+    created = [int(post[field]) for post in posts]
+    fresh = [post for post, c in zip(posts, created) if c > freshest]
+    return fresh, max(created) if fresh else freshest
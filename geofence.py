@@ -0,0 +1,168 @@
+from collections import defaultdict
+
+from nio.properties import PropertyHolder, FloatProperty, ListProperty, \
+    StringProperty
+
+
+class Geofence(object):
+
+    """ A polygon of (latitude, longitude) vertices.
+
+    Two vertices are the opposite corners of a box. Edges are compiled
+    once, so a point costs a bounding box check and, for polygons, one
+    comparison per edge. Polygons must not cross the antimeridian.
+
+    """
+
+    def __init__(self, points):
+        points = [(float(lat), float(lng)) for lat, lng in points]
+        if len(points) == 2:
+            (lat1, lng1), (lat2, lng2) = points
+            points = [(lat1, lng1), (lat1, lng2), (lat2, lng2), (lat2, lng1)]
+            self.is_box = True
+        elif len(points) >= 3:
+            self.is_box = False
+        else:
+            raise ValueError("A geofence needs 2 corners or 3 vertices")
+        lats = [lat for lat, _ in points]
+        lngs = [lng for _, lng in points]
+        self.bounds = (min(lats), min(lngs), max(lats), max(lngs))
+        # For each edge crossing a parallel: its latitude span, and the
+        # longitude it crosses at as a linear function of latitude.
+        self._edges = []
+        for (lat1, lng1), (lat2, lng2) in zip(points,
+                                              points[1:] + points[:1]):
+            if lat1 != lat2:
+                slope = (lng2 - lng1) / (lat2 - lat1)
+                self._edges.append((lat1, lat2, lng1 - slope * lat1, slope))
+
+    def contains(self, latitude, longitude):
+        south, west, north, east = self.bounds
+        if not (south <= latitude <= north and west <= longitude <= east):
+            return False
+        if self.is_box:
+            return True
+        inside = False
+        for lat1, lat2, offset, slope in self._edges:
+            if (lat1 > latitude) != (lat2 > latitude) and \
+                    longitude < offset + slope * latitude:
+                inside = not inside
+        return inside
+
+
+def post_coordinates(post):
+    """ The (latitude, longitude) of a post, None if it has no location. """
+    location = post.get('location') or {}
+    try:
+        return float(location['latitude']), float(location['longitude'])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+class GeofenceSet(object):
+
+    """ The union of geofences, applied to a page of posts at a time. """
+
+    def __init__(self, fences):
+        self.fences = list(fences)
+        self.bounds = (min(f.bounds[0] for f in self.fences),
+                       min(f.bounds[1] for f in self.fences),
+                       max(f.bounds[2] for f in self.fences),
+                       max(f.bounds[3] for f in self.fences))
+
+    def contains(self, latitude, longitude):
+        return any(fence.contains(latitude, longitude)
+                   for fence in self.fences)
+
+    def filter(self, posts):
+        """ The posts located inside the geofences, in order.
+
+        The coordinates of the whole page are extracted and checked
+        against the bounding box of every fence first, so only the
+        candidates left are tested against each polygon.
+
+        """
+        south, west, north, east = self.bounds
+        candidates = [
+            (post, point) for post, point
+            in zip(posts, map(post_coordinates, posts))
+            if point is not None and
+            south <= point[0] <= north and west <= point[1] <= east]
+        if len(self.fences) == 1 and self.fences[0].is_box:
+            return [post for post, _ in candidates]
+        return [post for post, point in candidates
+                if self.contains(*point)]
+
+
+class GeoPoint(PropertyHolder):
+    latitude = FloatProperty(title='Latitude', default=0.0)
+    longitude = FloatProperty(title='Longitude', default=0.0)
+
+
+class QueryGeofence(PropertyHolder):
+    query = StringProperty(title='Query', default='')
+    points = ListProperty(GeoPoint, title='Vertices', default=[])
+
+
+class GeofenceFiltering(object):
+
+    """ Block mixin that drops posts found outside a query's geofences.
+
+    Each of `geofences` is a polygon, or a box given by two corners,
+    attached to a query as configured, see `_query_names`. Fences with
+    an empty query apply to every query without its own. Posts outside
+    the fences of their query, or without a location, are dropped before
+    any signal is built.
+
+    """
+
+    geofences = ListProperty(QueryGeofence, title='Geofences', default=[])
+
+    def __init__(self):
+        super().__init__()
+        self._geofences = {}
+        self._query_fences = None
+
+    def configure(self, context):
+        super().configure(context)
+        fences = defaultdict(list)
+        for fence in self.geofences():
+            fences[fence.query().lower()].append(Geofence(
+                [(p.latitude(), p.longitude()) for p in fence.points()]))
+        self._geofences = dict(fences)
+        # Matched against the queries on first use, once resolved.
+        self._query_fences = None
+
+    def _geofence(self, name):
+        """ The GeofenceSet of a configured query, None if not fenced. """
+        fences = self._geofences.get(name.lower()) or \
+            self._geofences.get('')
+        return GeofenceSet(fences) if fences else None
+
+    def _query_fence(self):
+        """ The GeofenceSet of the current query, None if not fenced. """
+        query_fences = self._query_fences
+        if query_fences is None or len(query_fences) != self._n_queries:
+            query_fences = self._query_fences = [
+                self._names_fence(names) for names in self._query_names()]
+        return query_fences[self._idx]
+
+    def _names_fence(self, names):
+        fences = [self._geofence(name) for name in names]
+        if not fences or None in fences:
+            return None
+        return GeofenceSet(f for fence in fences for f in fence.fences)
+
+    def _required_fields(self):
+        return super()._required_fields() + \
+            ['location.latitude', 'location.longitude']
+
+    def _reindex_queries(self, old_idxs):
+        super()._reindex_queries(old_idxs)
+        self._query_fences = None
+
+    def _build_signals(self, posts):
+        fence = self._query_fence()
+        if fence is not None:
+            posts = fence.filter(posts)
+        return super()._build_signals(posts)
@@ -0,0 +1,81 @@
+import requests
+from requests.adapters import HTTPAdapter
+
+from nio.properties import PropertyHolder, IntProperty, BoolProperty, \
+    ObjectProperty, TimeDeltaProperty
+
+
+class HTTPOptions(PropertyHolder):
+    pool_size = IntProperty(title='Connection Pool Size', default=10)
+    keep_alive = BoolProperty(title='Keep Alive', default=True)
+    timeout = TimeDeltaProperty(title='Request Timeout',
+                                default={"seconds": 10})
+    compression = BoolProperty(title='Request Compressed Responses',
+                               default=True)
+
+
+def build_session(pool_size=10, keep_alive=True, compression=True):
+    """ Create a requests session backed by a single connection pool.
+
+    Args:
+        pool_size (int): max number of connections kept open per host.
+        keep_alive (bool): reuse connections between requests.
+        compression (bool): ask the API for gzip encoded responses.
+
+    Returns:
+        session (requests.Session)
+
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers['Accept-Encoding'] = \
+        'gzip, deflate' if compression else 'identity'
+    if not keep_alive:
+        session.headers['Connection'] = 'close'
+    return session
+
+
+class HTTPSession(object):
+
+    """ Block mixin that sends every Instagram request through one pool.
+
+    The session is created on configure and closed on stop, so paging
+    through `next_url` and rotating between queries reuse warm
+    connections instead of opening a new TCP/TLS connection per request.
+
+    """
+
+    http_options = ObjectProperty(HTTPOptions, title='HTTP Options')
+
+    def __init__(self):
+        super().__init__()
+        self._session = None
+
+    def configure(self, context):
+        super().configure(context)
+        options = self.http_options()
+        self._session = build_session(options.pool_size(),
+                                      options.keep_alive(),
+                                      options.compression())
+
+    def stop(self):
+        if self._session is not None:
+            self._session.close()
+        super().stop()
+
+    def _http_get(self, url, **kwargs):
+        """ GET a url through the block's connection pool.
+
+        Args:
+            url (str): the url to request.
+            kwargs: passed through to `requests.Session.get`.
+
+        Returns:
+            resp (Response)
+
+        """
+        kwargs.setdefault(
+            'timeout', self.http_options().timeout().total_seconds())
+        return self._session.get(url, **kwargs)
@@ -1,10 +1,29 @@
-import requests
-
 from nio.properties import PropertyHolder, StringProperty, \
-    ObjectProperty, BoolProperty, VersionProperty
-from nio.signal.base import Signal
+    ObjectProperty, BoolProperty, VersionProperty, ListProperty
+from nio.block.mixins.persistence.persistence import Persistence
+from nio.block.terminals import output
+from nio.command import command
+from nio.command.params.string import StringParameter
+from nio.types import StringType
+from nio.util.threading import spawn
 
 from .rest_polling.rest_block import RESTPolling
+from .concurrent_polling import ConcurrentPolling
+from .http_session import HTTPSession
+from .dedup_index import PostDeduplication
+from .instagram_signal import InstagramSignal
+from .json_stream import StreamingDecode
+from .adaptive_schedule import AdaptiveScheduling
+from .rate_limit import RateLimitBudget
+from .credential_pool import CredentialSharding
+from .cursor_checkpoint import CursorCheckpoint
+from .async_polling import AsyncPolling
+from .conditional_requests import ConditionalRequests
+from .polling_metrics import PollingInstrumentation, timed
+from .query_priority import PriorityScheduling
+from .signal_batching import SignalBatching
+from .signal_queue import QueuedEmission
+from .query_updates import QueryUpdates, remap
 
 
 class APICredentials(PropertyHolder):
@@ -12,21 +31,55 @@ class APICredentials(PropertyHolder):
                                default="[[INSTAGRAM_CLIENT_ID]]")
 
 
-class InstagramSignal(Signal):
-
-    def __init__(self, data):
-        super().__init__()
-        for k in data:
-            setattr(self, k, data[k])
-
-
-class Instagram(RESTPolling):
+@command('metrics')
+@command('add_query', StringParameter('query'))
+@command('remove_query', StringParameter('query'))
+@output('metrics', label='metrics')
+@output('default', default=True, label='default')
+class Instagram(SignalBatching, QueuedEmission, PollingInstrumentation,
+                QueryUpdates, CursorCheckpoint, Persistence, RateLimitBudget,
+                CredentialSharding, HTTPSession, ConditionalRequests,
+                PriorityScheduling, PostDeduplication, StreamingDecode,
+                AdaptiveScheduling, AsyncPolling, ConcurrentPolling,
+                RESTPolling):
 
     """ This block polls the Instagram API, searching for posts
     matching a configurable hashtag.
 
     Params:
         creds (APICredentials): API credentials
+        client_id_pool (list(str)): more client ids to shard hashtags
+            across.
+        credential_cooldown (timedelta): how long a rate limited client
+            id is left out.
+        safe_mode (bool): limit how many pages a single query may follow.
+        concurrent_polling (bool): poll every hashtag in parallel on each
+            polling interval instead of one hashtag per interval.
+        max_concurrency (int): max number of hashtags fetched at once.
+        polling_backend (PollingBackend): poll with threads or poll every
+            query on a single asyncio event loop.
+        http_options (HTTPOptions): connection pool and timeout settings.
+        conditional_requests (bool): send cache validators and skip
+            responses that did not change since the last poll.
+        deduplication (DedupOptions): drop posts already seen by any query.
+        signal_fields (list(str)): if set, the only post fields to keep,
+            as dotted paths.
+        stream_responses (bool): decode responses a post at a time and
+            notify signals in batches of `stream_batch_size`.
+        adaptive_polling (AdaptiveOptions): poll each query at an interval
+            based on how many fresh posts it returns.
+        query_priorities (list(QueryPriority)): poll some hashtags more
+            often than others.
+        circuit_breaker (BreakerOptions): bench hashtags that keep failing.
+        rate_limit (RateLimitOptions): hourly request budget shared by
+            every block using the same client id.
+        backup_interval (timedelta): how often query cursors are saved.
+        metrics_interval (timedelta): how often to notify query metrics,
+            never if zero.
+        output_batching (BatchOptions): merge the signals of many pages
+            and hashtags into fewer, larger lists.
+        signal_queue (QueueOptions): notify signals from a bounded queue
+            and what to do when it is full.
 
     """
 
@@ -34,24 +87,34 @@ class Instagram(RESTPolling):
     # Try to grab 50 in case they up the limit
     URL_FORMAT = ("https://api.instagram.com/v1/tags"
                   "/{0}/media/recent?count=50&client_id={1}&min_tag_id={2}")
-    version = VersionProperty("1.0.1")
+    CURSOR_FIELDS = ('_min_tag_id', '_prev_min_tag_id')
+    version = VersionProperty("1.1.0")
 
     creds = ObjectProperty(APICredentials, title='Credentials')
     safe_mode = BoolProperty(title='Safe Mode', default=True)
+    signal_fields = ListProperty(StringType, title='Signal Fields',
+                                 default=[])
 
     def __init__(self):
         super().__init__()
         self._min_tag_id = [None]
         self._prev_min_tag_id = [None]
+        self._min_tag_id_pending = [False]
+        self._signal_fields = None
 
     def configure(self, context):
         super().configure(context)
+        self._project_fields(self.signal_fields())
+        self._signal_fields = self._projection and self._projection.fields
         self._min_tag_id *= self._n_queries
         self._prev_min_tag_id *= self._n_queries
+        self._min_tag_id_pending *= self._n_queries
 
     def start(self):
-        self._initialize_all_min_tag_ids()
+        # Hold back polling of each hashtag until it is initialized.
+        self._min_tag_id_pending = [True] * self._n_queries
         super().start()
+        spawn(self._initialize_all_min_tag_ids)
 
     def _prepare_url(self, paging=False):
         """ Overridden from RESTPolling block.
@@ -64,23 +127,35 @@ class Instagram(RESTPolling):
             paging (bool): Are we paging?
 
         Returns:
-            None
+            headers (dict): conditional request headers, if any.
 
         """
+        self._prepare_query()
+        self._acquire_budget(paging)
+        self._build_url(paging)
+        return self._conditional_headers(self.url)
+
+    def _prepare_query(self):
         # If there is no min_tag_id, then this is likely the first poll and
         # we need to initialize the min_tag_id.
         if self.min_tag_id is None:
             self._initialize_min_tag_id()
+
+    @timed('prepare_url')
+    def _build_url(self, paging=False):
         if not paging:
+            self._count('polls')
             # New query so save off the new min_tag_id.
             self.prev_min_tag_id = self.min_tag_id
             self.url = self.URL_FORMAT.format(self.current_query,
-                                              self.creds().client_id(),
+                                              self._client_id(),
                                               self.prev_min_tag_id)
         else:
             self.url = "%s&min_tag_id=%s" % (self.url, self.prev_min_tag_id)
+        self._request_sent()
         self.logger.info("GETing url: {0}".format(self.url))
 
+    @timed('process_response')
     def _process_response(self, resp):
         """ Extract fresh posts from the Instagram api response object.
 
@@ -94,37 +169,108 @@ class Instagram(RESTPolling):
                 necessary.
 
         """
-        signals = []
-        resp = resp.json()
-        posts = resp['data']
+        self._response_received()
+        self._update_budget(resp)
+        if self._response_unchanged(resp):
+            self.logger.debug("No changes for {}".format(self.current_query))
+            self._count('unchanged')
+            self._schedule_next_poll()
+            return [], False
+        if self.stream_responses():
+            signals, resp = self._stream_posts(resp, self._build_signals)
+        else:
+            with self._timed('decode'):
+                resp = self._decode_response(resp)
+            with self._timed('build_signals'):
+                signals = self._build_signals(resp['data'])
         pagination = resp['pagination']
 
         self._update_min_tag_id(pagination)
         paging = self._check_paging(pagination)
 
-        for post in posts:
-            signals.append(InstagramSignal(post))
         self.logger.info("Created {0} new Instagram signals.".format(
             len(signals)))
+        if not paging:
+            self._schedule_next_poll()
 
         return signals, paging
 
+    def _build_signals(self, posts):
+        posts = self._drop_duplicate_posts(posts)
+        self._count_fresh_posts(len(posts))
+        return [InstagramSignal(post, self._signal_fields) for post in posts]
+
+    def _default_client_id(self):
+        return self.creds().client_id()
+
     def _get_post_id(self, post):
         return getattr(post, 'id', None)
 
     def _initialize_all_min_tag_ids(self):
-        with self._poll_lock:
-            for id in range(0, self._n_queries):
-                self._initialize_min_tag_id()
-                self._idx = (self._idx + 1) % self._n_queries
+        """ Initialize the min_tag_id of every hashtag in parallel.
 
+        Each hashtag is polled as soon as its own min_tag_id is ready
+        rather than after every hashtag has been initialized.
+
+        """
+        self._map_queries(self._initialize_query, range(self._n_queries))
+        self.logger.debug("Initialized min_tag_id for {} queries".format(
+            self._n_queries))
+
+    def _reindex_queries(self, old_idxs):
+        super()._reindex_queries(old_idxs)
+        self._min_tag_id = remap(self._min_tag_id, old_idxs)
+        self._prev_min_tag_id = remap(self._prev_min_tag_id, old_idxs)
+        self._min_tag_id_pending = remap(
+            self._min_tag_id_pending, old_idxs, True)
+        added = [idx for idx, old in enumerate(old_idxs) if old is None]
+        if added:
+            spawn(self._map_queries, self._initialize_query, added)
+
+    def _initialize_query(self):
+        persisted = self._persisted_cursor(self._idx, '_min_tag_id')
+        if persisted is None or not self._verify_min_tag_id(persisted):
+            self._initialize_min_tag_id()
+        self._min_tag_id_pending[self._idx] = False
+
+    def _query_ready(self, idx):
+        return not self._min_tag_id_pending[idx] and \
+            super()._query_ready(idx)
+
+    def _verify_min_tag_id(self, min_tag_id):
+        """ Resume from a persisted min_tag_id if the API still accepts it.
+
+        Only one request is needed, instead of the two made by
+        `_initialize_min_tag_id`.
+
+        """
+        url = self.URL_FORMAT.format(self.current_query,
+                                     self._client_id(),
+                                     min_tag_id)
+        try:
+            resp = self._http_get(url)
+            if resp.status_code != 200 or 'pagination' not in resp.json():
+                raise ValueError(
+                    "Instagram request returned status {}".format(
+                        resp.status_code))
+        except Exception as e:
+            self.logger.warning(
+                "Persisted min_tag_id {} for query {} is not usable: {}"
+                .format(min_tag_id, self.current_query, e))
+            return False
+        self.min_tag_id = min_tag_id
+        self.logger.debug("Resuming from min_tag_id {} for query: {}".format(
+            min_tag_id, self.current_query))
+        return True
+
+    @timed('initialize_min_tag_id')
     def _initialize_min_tag_id(self):
         try:
             self.min_tag_id = 0
             url = self.URL_FORMAT.format(self.current_query,
-                                         self.creds().client_id(),
+                                         self._client_id(),
                                          self.min_tag_id)
-            resp = requests.get(url)
+            resp = self._http_get(url)
             resp = resp.json()
             self.min_tag_id = resp['pagination']['min_tag_id']
             self.logger.debug(
@@ -133,9 +279,9 @@ class Instagram(RESTPolling):
             # And make a second request since the initial min_tag_id is
             # not always accurate the first time. Try it and see for yourself!
             url = self.URL_FORMAT.format(self.current_query,
-                                         self.creds().client_id(),
+                                         self._client_id(),
                                          self.min_tag_id)
-            resp = requests.get(url)
+            resp = self._http_get(url)
             resp = resp.json()
             pagination = resp['pagination']
             self._update_min_tag_id(pagination)
@@ -160,9 +306,24 @@ class Instagram(RESTPolling):
             self.logger.warning(
                 "Safe Mode: #{} is paging too many times: {}".format(
                     self.current_query, self.page_num))
+            self._count('safe_mode_stops')
+            return False
+        if not self._budget_allows_paging():
+            self.logger.warning(
+                "Rate limit budget is low, not paging #{}".format(
+                    self.current_query))
+            self._count('budget_stops')
+            return False
+        if 'next_url' in pagination and not self._queue_allows_paging():
+            self.logger.warning(
+                "Signal queue is full, pausing paging of #{}".format(
+                    self.current_query))
+            self._count('queue_pauses')
+            self._pause_paging(pagination['next_url'])
             return False
         if 'next_url' in pagination:
             self.url = pagination['next_url']
+            self._count('pages')
             return True
         else:
             return False
@@ -1,64 +1,194 @@
-import requests
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
-from nio.properties import StringProperty, TimeDeltaProperty, VersionProperty
-from nio.signal.base import Signal
+from nio.properties import StringProperty, TimeDeltaProperty, \
+    VersionProperty, IntProperty, ObjectProperty, PropertyHolder, \
+    ListProperty, BoolProperty
+from nio.block.mixins.persistence.persistence import Persistence
+from nio.block.terminals import output
+from nio.command import command
+from nio.command.params.string import StringParameter
+from nio.types import StringType
 from nio.util.discovery import not_discoverable
 
 from .rest_polling.rest_block import RESTPolling
+from .concurrent_polling import ConcurrentPolling
+from .http_session import HTTPSession
+from .dedup_index import PostDeduplication
+from .instagram_signal import InstagramSignal
+from .json_stream import StreamingDecode
+from .adaptive_schedule import AdaptiveScheduling
+from .rate_limit import RateLimitBudget
+from .credential_pool import CredentialSharding
+from .cursor_checkpoint import CursorCheckpoint
+from .async_polling import AsyncPolling
+from .conditional_requests import ConditionalRequests
+from .resolution_cache import get_cache
+from .freshness import split_fresh
+from .polling_metrics import PollingInstrumentation, timed
+from .query_priority import PriorityScheduling
+from .signal_batching import SignalBatching
+from .signal_queue import QueuedEmission
+from .query_updates import QueryUpdates, remap
+
+
+class IDCache(PropertyHolder):
+    file = StringProperty(title='Cache File', default='')
+    ttl = TimeDeltaProperty(title='Time to Live', default={"days": 7})
+    max_size = IntProperty(title='Max Entries', default=10000)
 
 
 @not_discoverable
-class InstagramSearchByBase(RESTPolling):
+@command('metrics')
+@command('add_query', StringParameter('query'))
+@command('remove_query', StringParameter('query'))
+@output('metrics', label='metrics')
+@output('default', default=True, label='default')
+class InstagramSearchByBase(SignalBatching, QueuedEmission,
+                            PollingInstrumentation, QueryUpdates,
+                            CursorCheckpoint, Persistence, RateLimitBudget,
+                            CredentialSharding, HTTPSession,
+                            ConditionalRequests, PriorityScheduling,
+                            PostDeduplication, StreamingDecode,
+                            AdaptiveScheduling, AsyncPolling,
+                            ConcurrentPolling, RESTPolling):
 
     """ This block polls the Instagram API, searching for all posts
     by the specified users.
 
     Params:
         client_id (string): api credentials.
+        client_id_pool (list(str)): more client ids to shard queries
+            across.
+        credential_cooldown (timedelta): how long a rate limited client
+            id is left out.
         lookback (timedelta): amount of time to lookback for posts on start.
+        concurrent_polling (bool): poll every query in parallel on each
+            polling interval instead of one query per interval.
+        max_concurrency (int): max number of queries fetched at once.
+        polling_backend (PollingBackend): poll with threads or poll every
+            query on a single asyncio event loop.
+        http_options (HTTPOptions): connection pool and timeout settings.
+        conditional_requests (bool): send cache validators and skip
+            responses that did not change since the last poll.
+        id_cache (IDCache): where and for how long resolved ids are cached.
+        background_warm_up (bool): resolve queries in the background
+            once started rather than while configuring.
+        deduplication (DedupOptions): drop posts already seen by any query.
+        signal_fields (list(str)): if set, the only post fields to keep,
+            as dotted paths.
+        stream_responses (bool): decode responses a post at a time and
+            notify signals in batches of `stream_batch_size`.
+        adaptive_polling (AdaptiveOptions): poll each query at an interval
+            based on how many fresh posts it returns.
+        query_priorities (list(QueryPriority)): poll some queries more
+            often than others.
+        circuit_breaker (BreakerOptions): bench queries that keep failing.
+        rate_limit (RateLimitOptions): hourly request budget shared by
+            every block using the same client id.
+        backup_interval (timedelta): how often query cursors are saved.
+        metrics_interval (timedelta): how often to notify query metrics,
+            never if zero.
+        output_batching (BatchOptions): merge the signals of many pages
+            and queries into fewer, larger lists.
+        signal_queue (QueueOptions): notify signals from a bounded queue
+            and what to do when it is full.
 
     """
 
-    version = VersionProperty("0.0.1")
+    version = VersionProperty("0.1.0")
     client_id = StringProperty(title="Client ID",
                                default="[[INSTAGRAM_CLIENT_ID]]")
     lookback = TimeDeltaProperty(
         default={"seconds": 300}, title="Lookback Period")
+    id_cache = ObjectProperty(IDCache, title='ID Cache')
+    background_warm_up = BoolProperty(
+        title='Resolve Queries After Start', default=False)
+    signal_fields = ListProperty(StringType, title='Signal Fields',
+                                 default=[])
 
     RESOURCE_URL_FORMAT = None
+    CURSOR_FIELDS = ('_freshest',)
 
     def __init__(self):
         super().__init__()
         self._created_field = 'created_time'
+        self._id_cache = None
+        self._signal_fields = None
+        self._resolved_names = []
+        # The ids or api parameters polled, indexed like the cursors
+        self._planned_queries = []
 
     def configure(self, context):
         super().configure(context)
-        lb = self._unix_time(datetime.utcnow() - self.lookback())
-        self._freshest = [lb] * self._n_queries
-        # Convert queries from usernames to ids.
-        self.queries = [i for i in [self._process_query(q)
-                        for q in self.queries()] if i]
+        self._project_fields(self.signal_fields())
+        self._signal_fields = self._projection and self._projection.fields
+        id_cache = self.id_cache()
+        self._id_cache = get_cache(id_cache.file(),
+                                   id_cache.ttl().total_seconds(),
+                                   id_cache.max_size())
+        if self.background_warm_up():
+            # Resolved by the warm-up thread once the block starts.
+            self._planned_queries = []
+            self._defer_queries()
+        else:
+            self._apply_queries(self.queries())
+        lb = self._lookback_time()
+        self._freshest = [self._initial_freshest(idx, lb)
+                          for idx in range(self._n_queries)]
+
+    def _apply_queries(self, queries):
+        """ Convert queries from usernames to ids. """
+        ids = self._process_queries(queries)
+        self._planned_queries = [i for i in ids if i]
+        self._resolved_names = [(str(query),) for query, _id
+                                in zip(queries, ids) if _id]
         # reset n in case some usernames did not convert to ids.
-        self._n_queries = len(self.queries())
+        self._n_queries = len(self._planned_queries)
+
+    @property
+    def current_query(self):
+        return self._planned_queries[self._idx]
+
+    def _cursor_keys(self):
+        return [str(query).lower() for query in self._planned_queries]
+
+    def _reindex_queries(self, old_idxs):
+        super()._reindex_queries(old_idxs)
+        lb = self._lookback_time()
+        self._freshest = [
+            self._initial_freshest(idx, lb) if old is None
+            else self._freshest[old] for idx, old in enumerate(old_idxs)]
+        self._prev_freshest = remap(self._prev_freshest, old_idxs)
 
-    def stop(self):
-        # self.persistence.save()
-        super().stop()
+    def _lookback_time(self):
+        return self._unix_time(datetime.utcnow() - self.lookback())
 
-    def persisted_values(self):
-        """Persist states using block mixin."""
-        return [query.lower()]
+    def _initial_freshest(self, idx, lb):
+        """ Resume a query from its persisted cursor, unless that is
+        older than the lookback period.
+
+        """
+        return max(lb, self._persisted_cursor(idx, '_freshest') or lb)
 
     def _prepare_url(self, paging=False):
+        self._acquire_budget(paging)
+        self._build_url(paging)
+        return self._conditional_headers(self.url)
+
+    @timed('prepare_url')
+    def _build_url(self, paging=False):
         # if paging then url is already set in _check_paging()
         if not paging:
+            self._count('polls')
             self.url = self.URL_FORMAT.format(
                 self.current_query,
-                self.client_id(),
+                self._client_id(),
                 self.freshest
             )
+        self._request_sent()
 
+    @timed('process_response')
     def _process_response(self, resp):
         """ Extract fresh posts from the Instagram api response object.
 
@@ -72,33 +202,120 @@ class InstagramSearchByBase(RESTPolling):
                 necessary.
 
         """
+        self._response_received()
+        self._update_budget(resp)
+        if self._response_unchanged(resp):
+            self.logger.debug("No changes for {}".format(self.current_query))
+            self._count('unchanged')
+            self._schedule_next_poll()
+            return [], False
+        if self.stream_responses():
+            return self._process_response_stream(resp)
         signals = []
-        resp = resp.json()
+        with self._timed('decode'):
+            resp = self._decode_response(resp)
 
         pagination = resp.get('pagination', [])
         paging = self._check_paging(pagination)
 
         fresh_posts = posts = resp.get('data', [])
         if len(posts) > 0:
-            self.update_freshness(posts)
-            fresh_posts = self.find_fresh_posts(posts)
+            fresh_posts, freshest = split_fresh(
+                posts, self.freshest, self._created_field)
+            self._advance_freshness(freshest)
 
-        signals = [Signal(p) for p in fresh_posts]
+        with self._timed('build_signals'):
+            signals = self._build_signals(fresh_posts)
         self.logger.info("Created {0} new Instagram signals.".format(
             len(signals)))
+        if not paging:
+            self._schedule_next_poll()
+
+        return signals, paging
+
+    def _process_response_stream(self, resp):
+        """ Streaming counterpart of `_process_response`.
 
+        Posts are compared against the freshness of the query before this
+        page, and the freshness is updated once the whole page is decoded.
+
+        """
+        freshest = newest = self.freshest
+
+        def build_signals(posts):
+            nonlocal newest
+            fresh_posts, batch_newest = split_fresh(
+                posts, freshest, self._created_field)
+            newest = max(newest, batch_newest)
+            return self._build_signals(fresh_posts)
+
+        signals, resp = self._stream_posts(resp, build_signals)
+        if newest > freshest:
+            self._advance_freshness(newest)
+        paging = self._check_paging(resp.get('pagination', []))
+        self.logger.info("Created {0} new Instagram signals.".format(
+            len(signals)))
+        if not paging:
+            self._schedule_next_poll()
         return signals, paging
 
+    def _advance_freshness(self, freshest):
+        """ Move the current query's cursor up to `freshest`. """
+        self.prev_freshest = self.freshest
+        self.freshest = freshest
+
+    def _required_fields(self):
+        return super()._required_fields() + [self._created_field]
+
+    def _build_signals(self, posts):
+        posts = self._drop_duplicate_posts(posts)
+        self._count_fresh_posts(len(posts))
+        return [InstagramSignal(p, self._signal_fields) for p in posts]
+
+    def _default_client_id(self):
+        return self.client_id()
+
+    def _query_names(self):
+        return self._resolved_names
+
     def _get_post_id(self, post):
         return getattr(post, 'id', None)
 
     def _check_paging(self, pagination):
+        if not self._budget_allows_paging():
+            self.logger.warning(
+                "Rate limit budget is low, not paging {}".format(
+                    self.current_query))
+            self._count('budget_stops')
+            return False
+        if 'next_url' in pagination and not self._queue_allows_paging():
+            self.logger.warning(
+                "Signal queue is full, pausing paging of {}".format(
+                    self.current_query))
+            self._count('queue_pauses')
+            self._pause_paging(pagination['next_url'])
+            return False
         if 'next_url' in pagination:
             self.url = pagination['next_url']
+            self._count('pages')
             return True
         else:
             return False
 
+    def _process_queries(self, queries):
+        """ Convert every query to an id, resolving cache misses in
+        parallel batches of `max_concurrency` requests.
+
+        """
+        workers = max(1, min(self.max_concurrency(), len(queries)))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            ids = list(executor.map(self._process_query, queries))
+        try:
+            self._id_cache.save()
+        except OSError as e:
+            self.logger.warning("Failed to save id cache: {}".format(e))
+        return ids
+
     def _process_query(self, query):
         """ Queries need to be converted from username to id.
 
@@ -110,10 +327,18 @@ class InstagramSearchByBase(RESTPolling):
         """
         # If there is a cached id for this user, return it
         # and skip the request
-        _id = query.lower()
+        key = "{}:{}".format(type(self).__name__, query.lower())
+        _id = self._id_cache.get(key)
         if _id is not None:
             return _id
+        with self._timed('resolve', query):
+            _id = self._resolve_query(query)
+        if _id is not None:
+            self._id_cache.set(key, _id)
+        return _id
 
+    def _resolve_query(self, query):
+        """ Look up the id of a query with the Instagram api. """
         resource_url = self._construct_resource_url(query)
 
         resp = self._make_request(resource_url)
@@ -142,11 +367,11 @@ class InstagramSearchByBase(RESTPolling):
         if self.RESOURCE_URL_FORMAT is not None:
             return self.RESOURCE_URL_FORMAT.format(
                 query,
-                self.client_id)
+                self._client_id(query))
 
     def _make_request(self, url):
         try:
-            resp = requests.get(url)
+            resp = self._http_get(url)
         except Exception as e:
             self.logger.error("GET request failed: {0}".format(e))
             return
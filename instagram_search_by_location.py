@@ -3,9 +3,10 @@ import re
 from nio.properties import VersionProperty
 
 from .instagram_search_by import InstagramSearchByBase
+from .geofence import GeofenceFiltering
 
 
-class InstagramSearchByLocation(InstagramSearchByBase):
+class InstagramSearchByLocation(GeofenceFiltering, InstagramSearchByBase):
 
     """ This block polls the Instagram API, searching for all posts
     by the specified users.
@@ -13,6 +14,8 @@ class InstagramSearchByLocation(InstagramSearchByBase):
     Params:
         client_id (string): api credentials.
         lookback (timedelta): amount of time to lookback for posts on start.
+        geofences (list(QueryGeofence)): polygons or boxes that the posts
+            of a location must be inside of.
 
     """
 
@@ -21,7 +24,7 @@ class InstagramSearchByLocation(InstagramSearchByBase):
     URL_FORMAT = ("https://api.instagram.com/v1/locations"
                   "/{0}/media/recent?count=50&client_id={1}&min_timestamp={2}")
 
-    version = VersionProperty("0.0.2")
+    version = VersionProperty("0.1.0")
     RESOURCE_URL_FORMAT = ("https://api.instagram.com/v1"
                            "/locations/search?{0}&client_id={1}")
 
@@ -36,12 +39,12 @@ class InstagramSearchByLocation(InstagramSearchByBase):
             lat, lng = re.sub('\s', '', query).split(',')
             resource_url = resource_url.format(
                 'lat={0}&lng={1}'.format(lat, lng),
-                self.client_id())
+                self._client_id(query))
 
         else:
             resource_url = resource_url.format(
                 'facebook_places_id={}'.format(query),
-                self.client_id())
+                self._client_id(query))
 
         return resource_url
 
@@ -1,7 +1,9 @@
 from nio.properties import ListProperty, IntProperty, FloatProperty, \
-    PropertyHolder, VersionProperty
+    PropertyHolder, VersionProperty, BoolProperty
 
 from .instagram_search_by import InstagramSearchByBase
+from .geofence import GeofenceFiltering, post_coordinates
+from .radius_tiling import Circle, LocationIndex, plan_tiles
 
 
 class LocationRadius(PropertyHolder):
@@ -10,7 +12,7 @@ class LocationRadius(PropertyHolder):
     longitude = FloatProperty(title='Longitude', default=0.0)
 
 
-class InstagramSearchByRadius(InstagramSearchByBase):
+class InstagramSearchByRadius(GeofenceFiltering, InstagramSearchByBase):
 
     """ This block polls the Instagram API, searching for all posts
     by the specified users.
@@ -18,6 +20,10 @@ class InstagramSearchByRadius(InstagramSearchByBase):
     Params:
         client_id (string): api credentials.
         lookback (timedelta): amount of time to lookback for posts on start.
+        merge_locations (bool): search overlapping locations with merged
+            circles and route each post back to the locations it is in.
+        geofences (list(QueryGeofence)): polygons or boxes that the posts
+            of a location must be inside of.
 
     """
 
@@ -26,12 +32,85 @@ class InstagramSearchByRadius(InstagramSearchByBase):
     URL_FORMAT = ("https://api.instagram.com/v1/media"
                   "/search?{0}&count=50&client_id={1}&min_timestamp={2}")
 
+    # Largest distance accepted by media/search
+    MAX_DISTANCE = 5000
+
     queries = ListProperty(LocationRadius, title='Locations')
-    version = VersionProperty("0.0.2")
+    merge_locations = BoolProperty(title='Merge Overlapping Locations',
+                                   default=False)
+    version = VersionProperty("0.1.0")
 
     def __init__(self):
         super().__init__()
         self._created_field = 'created_time'
+        self._locations = None
+        self._location_index = None
+        self._tile_names = None
+        self._location_fences = None
+
+    def _process_queries(self, queries):
+        """ Plan the circles to search when merging locations.
+
+        The original locations are kept in a spatial index so that posts
+        found by a merged circle can be routed back to them.
+
+        """
+        if not self.merge_locations():
+            self._locations = self._location_index = None
+            return super()._process_queries(queries)
+        circles = [Circle(q.latitude(), q.longitude(), q.radius())
+                   for q in queries]
+        tiles = plan_tiles(circles, self.MAX_DISTANCE)
+        self.logger.info("Searching {} locations with {} requests".format(
+            len(circles), len(tiles)))
+        self._locations = [self._process_query(q) for q in queries]
+        self._location_index = LocationIndex(circles)
+        # Matched against the geofences on first use.
+        self._location_fences = None
+        self._tile_names = [tuple(self._locations[idx] for idx in members)
+                            for _, members in tiles]
+        return ["lat={0}&lng={1}&distance={2}".format(*tile)
+                for tile, _ in tiles]
+
+    def _query_names(self):
+        """ Locations are named by their api parameters. """
+        if self._location_index is not None:
+            return self._tile_names
+        return [(query,) for query in self._planned_queries]
+
+    def _query_fence(self):
+        # Merged circles are fenced per location while routing posts.
+        if self._location_index is not None:
+            return None
+        return super()._query_fence()
+
+    def _build_signals(self, posts):
+        """ Keep the posts inside an original location and its geofence,
+        and tag each with the locations it is in, as `locations`.
+
+        """
+        if self._location_index is None:
+            return super()._build_signals(posts)
+        routed = []
+        fences = self._location_fences
+        if fences is None:
+            fences = self._location_fences = [
+                self._geofence(location) for location in self._locations]
+        for post in posts:
+            point = post_coordinates(post)
+            if point is None:
+                continue
+            idxs = [idx for idx in self._location_index.locate(*point)
+                    if fences[idx] is None or fences[idx].contains(*point)]
+            if idxs:
+                routed.append((post, idxs))
+        signals = super()._build_signals([post for post, _ in routed])
+        # Duplicate posts may have been dropped, match by post.
+        idxs_by_post = {id(post): idxs for post, idxs in routed}
+        for signal in signals:
+            signal.locations = [self._locations[idx]
+                                for idx in idxs_by_post[id(signal._post)]]
+        return signals
 
     def _process_query(self, query):
         """ Convert LocationRadius objects into lat/lng api parameters.
@@ -41,6 +120,14 @@ class InstagramSearchByRadius(InstagramSearchByBase):
         return params.format(
             query.latitude(), query.longitude(), query.radius())
 
-    @property
-    def current_query(self):
-        return self.queries[self._idx]
+    def _parse_query(self, query):
+        """ Commands give locations as "latitude,longitude,radius". """
+        latitude, longitude, radius = query.split(',')
+        location = LocationRadius()
+        location.from_dict({'latitude': float(latitude),
+                            'longitude': float(longitude),
+                            'radius': int(radius)})
+        return location
+
+    def _query_key(self, query):
+        return self._process_query(query)
@@ -21,7 +21,7 @@ class InstagramSearchByUser(InstagramSearchByBase):
 
     RESOURCE_URL_FORMAT = ("https://api.instagram.com/v1/"
                            "users/search?q={0}&client_id={1}")
-    version = VersionProperty("1.0.1")
+    version = VersionProperty("1.1.0")
 
     def _extract_resource_id(self, users, query):
         for user in users:
@@ -31,6 +31,7 @@ class InstagramSearchByUser(InstagramSearchByBase):
                 return _id
 
     def _on_failure(self, resp, paging, url):
+        self._query_failed(resp)
         execute_retry = True
         try:
             status_code = resp.status_code
@@ -42,6 +43,9 @@ class InstagramSearchByUser(InstagramSearchByBase):
                     "Skipping private user: {}".format(self.current_query))
                 execute_retry = False
                 self._increment_idx()
+            elif self._query_benched(self._idx):
+                execute_retry = False
+                self._increment_idx()
         finally:
             self.logger.error(
                 "Polling request of {} returned status {}: {}".format(
@@ -0,0 +1,48 @@
+from nio.signal.base import Signal
+
+
+class InstagramSignal(Signal):
+
+    """ Signal wrapping a decoded Instagram post without copying it.
+
+    Post fields are looked up in the wrapped dict when they are read, so
+    building a signal costs the same however large the post is. Fields
+    set on the signal afterwards take precedence over the post's.
+
+    Args:
+        data (dict): a post from the `data` list of an api response.
+        fields (frozenset): if given, the only top-level post fields the
+            signal exposes.
+
+    """
+
+    __slots__ = ('_post', '_fields')
+
+    def __init__(self, data, fields=None):
+        super().__init__()
+        self._post = data
+        self._fields = fields
+
+    def __getattr__(self, name):
+        # Only reached when normal lookup fails, i.e. for post fields.
+        if not name.startswith('_') and \
+                (self._fields is None or name in self._fields):
+            try:
+                return self._post[name]
+            except KeyError:
+                pass
+        raise AttributeError(name)
+
+    def to_dict(self, include_hidden=False, with_type=False):
+        if self._fields is None:
+            data = dict(self._post)
+        else:
+            data = {k: v for k, v in self._post.items() if k in self._fields}
+        attrs = super().to_dict(include_hidden)
+        # The wrapped post is not an attribute of the signal.
+        for slot in self.__slots__:
+            attrs.pop(slot, None)
+        data.update(attrs)
+        if with_type and isinstance(with_type, str):
+            data[with_type] = type(self).__name__
+        return data
@@ -0,0 +1,267 @@
+import codecs
+import json
+
+from nio.properties import BoolProperty, IntProperty
+
+
+class FieldProjection(object):
+
+    """ The post fields to keep, as dotted paths compiled into a tree.
+
+    A path such as `images.standard_resolution.url` keeps only that
+    branch of a post, and a path without dots keeps the whole field.
+    Paths into a list apply to each object in it. `required` paths are
+    kept for the block's own use, e.g. the post id for deduplication,
+    while `fields` only names the top-level fields of `paths`.
+
+    Args:
+        paths (list(str)): the fields to keep.
+        required (list(str)): more fields to keep.
+
+    """
+
+    def __init__(self, paths, required=()):
+        self.fields = frozenset(path.split('.')[0] for path in paths)
+        # Each key maps to the tree of its value, None to keep it all.
+        self.tree = {}
+        for path in list(paths) + list(required):
+            self._add(path.split('.'))
+
+    def project(self, value, tree=None):
+        """ The parts of a decoded post (or of a field) in the tree. """
+        tree = self.tree if tree is None else tree
+        if isinstance(value, list):
+            return [self.project(item, tree) for item in value]
+        if not isinstance(value, dict):
+            return value
+        return {key: value[key] if branch is None
+                else self.project(value[key], branch)
+                for key, branch in tree.items() if key in value}
+
+    def _add(self, keys):
+        node = self.tree
+        for key in keys[:-1]:
+            if key in node and node[key] is None:
+                # The whole field is kept already.
+                return
+            node = node.setdefault(key, {})
+        node[keys[-1]] = None
+
+
+class MediaStream(object):
+
+    """ Incremental decoder for Instagram media responses.
+
+    Instagram responses are a single object with a `data` list of posts
+    next to small `pagination` and `meta` objects. MediaStream decodes
+    the posts one at a time from an iterable of byte chunks, so only the
+    posts that have not been consumed yet and the current chunk are held
+    in memory. Every other top-level field is decoded whole into `fields`,
+    which is complete once the posts have been iterated.
+
+    With a `projection`, each post is trimmed as soon as it is decoded,
+    so only the fields it keeps are held on to.
+
+    Args:
+        chunks (iterable(bytes)): the raw response body, e.g.
+            `resp.iter_content(chunk_size)`.
+        array (str): name of the top-level list to stream.
+        projection (FieldProjection): the post fields to keep.
+
+    """
+
+    # Drop consumed text from the buffer once this much has piled up.
+    COMPACT_SIZE = 65536
+
+    def __init__(self, chunks, array='data', projection=None):
+        self.fields = {}
+        self._chunks = iter(chunks)
+        self._array = array
+        self._projection = projection
+        self._utf8 = codecs.getincrementaldecoder('utf-8')()
+        self._decoder = json.JSONDecoder()
+        self._buf = ''
+        self._pos = 0
+        self._eof = False
+
+    def __iter__(self):
+        self._expect('{')
+        if self._peek() == '}':
+            self._pos += 1
+            return
+        while True:
+            key = self._value()
+            self._expect(':')
+            if key == self._array and self._peek() == '[':
+                self._pos += 1
+                yield from self._items()
+            else:
+                self.fields[key] = self._value()
+            if self._expect(',}') == '}':
+                return
+
+    def batches(self, size):
+        """ Iterate the streamed posts in lists of up to `size` posts. """
+        batch = []
+        for item in self:
+            batch.append(item)
+            if len(batch) >= size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def _items(self):
+        if self._peek() == ']':
+            self._pos += 1
+            return
+        while True:
+            if self._projection is None:
+                yield self._value()
+            else:
+                yield self._projection.project(self._value())
+            if self._expect(',]') == ']':
+                return
+
+    def _value(self):
+        """ Decode the next complete JSON value in the stream. """
+        self._peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buf, self._pos)
+            except ValueError:
+                if not self._read():
+                    raise
+                continue
+            # A number or literal that ends the buffer may be cut short.
+            if end == len(self._buf) and self._read():
+                continue
+            self._pos = end
+            return value
+
+    def _peek(self):
+        """ Skip whitespace and return the next character. """
+        while True:
+            while self._pos < len(self._buf) and \
+                    self._buf[self._pos] in ' \t\r\n':
+                self._pos += 1
+            if self._pos < len(self._buf):
+                return self._buf[self._pos]
+            if not self._read():
+                raise ValueError("Unexpected end of JSON response")
+
+    def _expect(self, chars):
+        char = self._peek()
+        if char not in chars:
+            raise ValueError("Expected one of {!r} at offset {}, got {!r}"
+                             .format(chars, self._pos, char))
+        self._pos += 1
+        return char
+
+    def _read(self):
+        """ Append the next chunk to the buffer.
+
+        Returns:
+            read (bool): False once the stream is exhausted.
+
+        """
+        if self._eof:
+            return False
+        if self._pos > self.COMPACT_SIZE:
+            self._buf = self._buf[self._pos:]
+            self._pos = 0
+        for chunk in self._chunks:
+            text = self._utf8.decode(chunk)
+            if text:
+                self._buf += text
+                return True
+        self._eof = True
+        self._buf += self._utf8.decode(b'', final=True)
+        return False
+
+
+class StreamingDecode(object):
+
+    """ Block mixin for decoding media responses a post at a time.
+
+    With `stream_responses` enabled, signals are built and notified in
+    mini-batches of `stream_batch_size` posts while the response is still
+    being decoded, instead of after `resp.json()` has loaded the whole
+    page. This lowers peak memory and the time to the first signal.
+
+    Blocks that call `_project_fields` trim every post as soon as it is
+    decoded, streaming or not, see `_decode_response`.
+
+    """
+
+    stream_responses = BoolProperty(title='Stream Responses', default=False)
+    stream_batch_size = IntProperty(title='Stream Batch Size', default=50)
+
+    CHUNK_SIZE = 16384
+
+    def __init__(self):
+        super().__init__()
+        self._projection = None
+
+    def _project_fields(self, paths):
+        """ Only keep the post fields in `paths`, every field if empty.
+
+        The `_required_fields` are kept too.
+
+        """
+        self._projection = FieldProjection(
+            paths, self._required_fields()) if paths else None
+
+    def _required_fields(self):
+        """ Post fields the block needs whatever it projects. """
+        return ['id']
+
+    def _decode_response(self, resp):
+        """ Decode a whole response, projecting its posts if configured.
+
+        Returns:
+            body (dict)
+
+        """
+        if self._projection is None:
+            return resp.json()
+        stream = MediaStream([resp.content], projection=self._projection)
+        posts = list(stream)
+        return dict(stream.fields, data=posts)
+
+    def _fetch_page(self, url, **kwargs):
+        kwargs.setdefault('stream', self.stream_responses())
+        return super()._fetch_page(url, **kwargs)
+
+    def _stream_posts(self, resp, build_signals):
+        """ Decode the posts of a response and notify them in mini-batches.
+
+        Args:
+            resp (Response): an api response, preferably requested with
+                `stream=True`.
+            build_signals (callable): turns a list of posts into a list of
+                signals.
+
+        Returns:
+            signals (list(Signal)): the last mini-batch, left for the
+                caller to notify.
+            fields (dict): every other top-level field of the response.
+
+        """
+        stream = MediaStream(resp.iter_content(self.CHUNK_SIZE),
+                             projection=self._projection)
+        pending = []
+        notified = 0
+        for posts in stream.batches(self.stream_batch_size()):
+            signals = build_signals(posts)
+            if not signals:
+                continue
+            if pending:
+                self._include_query(pending)
+                self.notify_signals(pending)
+                notified += len(pending)
+            pending = signals
+        if notified:
+            self.logger.debug("Notified {} signals while streaming".format(
+                notified))
+        return pending, stream.fields
@@ -0,0 +1,211 @@
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import timedelta
+from functools import wraps
+from threading import Lock
+from time import monotonic, perf_counter
+
+from nio.modules.scheduler import Job
+from nio.properties import TimeDeltaProperty
+from nio.signal.base import Signal
+
+from .concurrent_polling import _QueryLocal
+
+
+def timed(name):
+    """ Record the duration of every call of a block method. """
+    def decorator(method):
+        @wraps(method)
+        def wrapper(self, *args, **kwargs):
+            with self._timed(name):
+                return method(self, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class LatencyHistogram(object):
+
+    """ Latency distribution with fixed, roughly logarithmic buckets.
+
+    Recording a value is a bisect and two additions, so histograms can
+    stay on in production. Percentiles are reported as the upper bound
+    of the bucket they fall in.
+
+    """
+
+    # Bucket upper bounds in milliseconds
+    BOUNDS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000,
+              30000, 60000)
+
+    def __init__(self):
+        self.counts = [0] * (len(self.BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        ms = seconds * 1000
+        self.counts[bisect_left(self.BOUNDS, ms)] += 1
+        self.count += 1
+        self.total += ms
+        if ms > self.max:
+            self.max = ms
+
+    def percentile(self, q):
+        """ Upper bound in milliseconds of the bucket holding quantile q. """
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for idx, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count:
+                return self.BOUNDS[idx] if idx < len(self.BOUNDS) \
+                    else self.max
+        return self.max
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'mean_ms': self.total / self.count if self.count else None,
+            'p50_ms': self.percentile(0.5),
+            'p99_ms': self.percentile(0.99),
+            'max_ms': self.max,
+        }
+
+
+class QueryMetrics(object):
+
+    """ Counters, latency histograms and cursor age of one query. """
+
+    def __init__(self):
+        self.counters = defaultdict(int)
+        self.latency = defaultdict(LatencyHistogram)
+        self.cursor_advanced_at = None
+        self._lock = Lock()
+
+    def count(self, name, n=1):
+        with self._lock:
+            self.counters[name] += n
+
+    def observe(self, name, seconds):
+        with self._lock:
+            self.latency[name].observe(seconds)
+
+    def to_dict(self, now):
+        with self._lock:
+            return {
+                'counters': dict(self.counters),
+                'latency': {name: histogram.to_dict()
+                            for name, histogram in self.latency.items()},
+                'cursor_age': None if self.cursor_advanced_at is None
+                else now - self.cursor_advanced_at,
+            }
+
+
+class PollingMetrics(object):
+
+    """ QueryMetrics of every query, keyed by query. """
+
+    def __init__(self):
+        self._queries = {}
+        self._lock = Lock()
+
+    def query(self, key):
+        metrics = self._queries.get(key)
+        if metrics is None:
+            with self._lock:
+                metrics = self._queries.setdefault(key, QueryMetrics())
+        return metrics
+
+    def snapshot(self, now=None):
+        now = monotonic() if now is None else now
+        with self._lock:
+            queries = list(self._queries.items())
+        return {str(key): metrics.to_dict(now) for key, metrics in queries}
+
+
+class PollingInstrumentation(object):
+
+    """ Block mixin that records per-query polling metrics.
+
+    Blocks time their hot paths with `timed` or `_timed` and count events
+    with `_count`. Requests are timed from `_request_sent` until the
+    response reaches `_response_received`. Blocks expose `metrics` as a
+    command, and if `metrics_interval` is set the metrics are notified on
+    the `metrics` output as one signal per query on that interval.
+
+    """
+
+    _request_started = _QueryLocal('_request_started')
+
+    metrics_interval = TimeDeltaProperty(title='Metrics Interval',
+                                         default={"seconds": 0})
+
+    def __init__(self):
+        super().__init__()
+        self._metrics = PollingMetrics()
+        self._metrics_job = None
+
+    def start(self):
+        super().start()
+        interval = self.metrics_interval()
+        if interval > timedelta(0):
+            self._metrics_job = Job(self._report_metrics, interval, True)
+
+    def stop(self):
+        if self._metrics_job is not None:
+            self._metrics_job.cancel()
+            self._metrics_job = None
+        super().stop()
+
+    def metrics(self):
+        """ Command: metrics of every query polled so far. """
+        return self._metrics.snapshot()
+
+    def _report_metrics(self):
+        signals = [Signal(dict(query=query, **metrics))
+                   for query, metrics in self.metrics().items()]
+        if signals:
+            self.notify_signals(signals, output_id='metrics')
+
+    def _query_metrics(self, query=None):
+        return self._metrics.query(
+            self.current_query if query is None else query)
+
+    def _count(self, name, n=1, query=None):
+        self._query_metrics(query).count(name, n)
+
+    @contextmanager
+    def _timed(self, name, query=None):
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self._query_metrics(query).observe(name, perf_counter() - start)
+
+    def _request_sent(self):
+        """ Call once a polling request is ready to be sent. """
+        self._request_started = perf_counter()
+
+    def _response_received(self):
+        """ Call when a polling response reaches `_process_response`. """
+        if self._request_started is not None:
+            self._query_metrics().observe(
+                'request', perf_counter() - self._request_started)
+            self._request_started = None
+
+    def _count_fresh_posts(self, count):
+        super()._count_fresh_posts(count)
+        self._count('posts', count)
+        if count:
+            self._query_metrics().cursor_advanced_at = monotonic()
+
+    def _query_failed(self, resp=None):
+        self._count('failures')
+        super()._query_failed(resp)
+
+    def _query_skipped(self, reason):
+        self._count('skipped')
+        super()._query_skipped(reason)
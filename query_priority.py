@@ -0,0 +1,238 @@
+from threading import Lock
+from time import monotonic
+
+from nio.properties import PropertyHolder, BoolProperty, IntProperty, \
+    ListProperty, ObjectProperty, StringProperty, TimeDeltaProperty
+
+from .query_updates import remap
+
+
+class PriorityScheduler(object):
+
+    """ Share polls between queries in proportion to their weights.
+
+    `pick` chooses the next query with smooth weighted round-robin: a
+    query of weight `w` out of a total weight `W` is picked `w` times in
+    every `W` picks, spread evenly, so no query waits more than `W`
+    picks however heavy the others are.
+
+    `cycle` does the same for concurrent polling cycles: the heaviest
+    queries are polled every cycle and a query of weight `w` every
+    `max_weight / w` cycles.
+
+    """
+
+    def __init__(self, weights):
+        self.weights = [max(1, weight) for weight in weights]
+        self._top = max(self.weights, default=1)
+        self._current = [0] * len(self.weights)
+        self._credit = [0.0] * len(self.weights)
+        self._lock = Lock()
+
+    def pick(self, ready):
+        """ The index of the query to poll next, out of `ready`. """
+        with self._lock:
+            total = sum(self.weights[idx] for idx in ready)
+            for idx in ready:
+                self._current[idx] += self.weights[idx]
+            best = max(ready, key=lambda idx: self._current[idx])
+            self._current[best] -= total
+            return best
+
+    def cycle(self, ready):
+        """ The indexes out of `ready` to poll during this cycle. """
+        due = []
+        with self._lock:
+            for idx in ready:
+                self._credit[idx] += self.weights[idx] / self._top
+                if self._credit[idx] >= 1 - 1e-9:
+                    self._credit[idx] -= 1
+                    due.append(idx)
+        return due
+
+
+class CircuitBreaker(object):
+
+    """ Bench queries that keep failing, with exponential backoff.
+
+    After `threshold` consecutive failures a query is benched for
+    `min_backoff` seconds, doubling with every further failure up to
+    `max_backoff`. Once the bench time is over the query gets a single
+    trial poll; a success resets it.
+
+    """
+
+    def __init__(self, n_queries, threshold=3, min_backoff=60,
+                 max_backoff=3600):
+        self.n_queries = n_queries
+        self.threshold = threshold
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self._failures = [0] * n_queries
+        self._benched_until = [0] * n_queries
+
+    def allows(self, idx, now=None):
+        now = monotonic() if now is None else now
+        return now >= self._benched_until[idx]
+
+    def failure(self, idx, now=None):
+        """ Record a failed poll.
+
+        Returns:
+            backoff (float): seconds the query is benched for, 0 if it is
+                not benched.
+
+        """
+        now = monotonic() if now is None else now
+        self._failures[idx] += 1
+        excess = self._failures[idx] - self.threshold
+        if excess < 0:
+            return 0
+        backoff = min(self.max_backoff, self.min_backoff * 2 ** excess)
+        self._benched_until[idx] = now + backoff
+        return backoff
+
+    def success(self, idx):
+        self._failures[idx] = 0
+        self._benched_until[idx] = 0
+
+    def reindex(self, old_idxs):
+        """ Remap the breaker to changed queries, see `remap`. """
+        self.n_queries = len(old_idxs)
+        self._failures = remap(self._failures, old_idxs, 0)
+        self._benched_until = remap(self._benched_until, old_idxs, 0)
+
+
+class QueryPriority(PropertyHolder):
+    query = StringProperty(title='Query', default='')
+    weight = IntProperty(title='Weight', default=1)
+
+
+class BreakerOptions(PropertyHolder):
+    enabled = BoolProperty(title='Enabled', default=False)
+    failure_threshold = IntProperty(title='Failures Before Benching',
+                                    default=3)
+    min_backoff = TimeDeltaProperty(title='Min Bench Time',
+                                    default={"seconds": 60})
+    max_backoff = TimeDeltaProperty(title='Max Bench Time',
+                                    default={"seconds": 3600})
+
+
+class PriorityScheduling(object):
+
+    """ Block mixin for weighted query scheduling and failure benching.
+
+    Queries listed in `query_priorities` are polled in proportion to
+    their weight, other queries have weight 1. Weights are matched
+    against the queries as configured, see `_query_names`. With the
+    `circuit_breaker` enabled, queries that keep failing are benched
+    instead of being retried or polled every cycle.
+
+    """
+
+    query_priorities = ListProperty(QueryPriority, title='Query Priorities',
+                                    default=[])
+    circuit_breaker = ObjectProperty(BreakerOptions, title='Circuit Breaker')
+
+    def __init__(self):
+        super().__init__()
+        self._scheduler = None
+        self._breaker = None
+        self._priority_lock = Lock()
+
+    def configure(self, context):
+        super().configure(context)
+        # Built on first use, once the block has resolved its queries.
+        self._scheduler = self._breaker = None
+
+    def _query_names(self):
+        """ The configured queries each polled query stands for. """
+        return [(str(query),) for query in self.queries()]
+
+    def _priority_scheduler(self):
+        """ The PriorityScheduler, or None if every weight is 1. """
+        with self._priority_lock:
+            if self._scheduler is None or \
+                    len(self._scheduler.weights) != self._n_queries:
+                priorities = {p.query().lower(): p.weight()
+                              for p in self.query_priorities()}
+                weights = [max(priorities.get(name.lower(), 1)
+                               for name in names)
+                           for names in self._query_names()]
+                self._scheduler = PriorityScheduler(weights)
+            scheduler = self._scheduler
+        if all(weight == 1 for weight in scheduler.weights):
+            return None
+        return scheduler
+
+    def _circuit_breaker(self):
+        options = self.circuit_breaker()
+        if not options.enabled():
+            return None
+        with self._priority_lock:
+            if self._breaker is None or \
+                    self._breaker.n_queries != self._n_queries:
+                self._breaker = CircuitBreaker(
+                    self._n_queries, options.failure_threshold(),
+                    options.min_backoff().total_seconds(),
+                    options.max_backoff().total_seconds())
+            return self._breaker
+
+    def _reindex_queries(self, old_idxs):
+        super()._reindex_queries(old_idxs)
+        with self._priority_lock:
+            # Weights are matched against the new queries on next use.
+            self._scheduler = None
+            if self._breaker is not None:
+                self._breaker.reindex(old_idxs)
+
+    def _query_ready(self, idx):
+        breaker = self._circuit_breaker()
+        return (breaker is None or breaker.allows(idx)) and \
+            super()._query_ready(idx)
+
+    def _select_ready_query(self):
+        scheduler = self._priority_scheduler()
+        if scheduler is None:
+            return super()._select_ready_query()
+        with self._poll_lock:
+            ready = [idx for idx in range(self._n_queries)
+                     if self._query_ready(idx)]
+            if not ready:
+                return False
+            self._idx = scheduler.pick(ready)
+            return True
+
+    def _queries_to_poll(self):
+        ready = super()._queries_to_poll()
+        scheduler = self._priority_scheduler()
+        return ready if scheduler is None else scheduler.cycle(ready)
+
+    def _query_benched(self, idx):
+        breaker = self._circuit_breaker()
+        return breaker is not None and not breaker.allows(idx)
+
+    def _query_failed(self, resp=None):
+        super()._query_failed(resp)
+        breaker = self._circuit_breaker()
+        # Rate limiting is not the fault of the query.
+        if breaker is None or getattr(resp, 'status_code', None) == 429:
+            return
+        backoff = breaker.failure(self._idx)
+        if backoff:
+            self.logger.warning("Benching query {} for {:.0f}s".format(
+                self.current_query, backoff))
+
+    def _schedule_next_poll(self):
+        super()._schedule_next_poll()
+        breaker = self._circuit_breaker()
+        if breaker is not None:
+            breaker.success(self._idx)
+
+    def _on_failure(self, resp, paging, url):
+        self._query_failed(resp)
+        if self._query_benched(self._idx):
+            # Move on to the next query instead of retrying.
+            self._increment_idx()
+            return
+        super()._on_failure(resp, paging, url)
@@ -0,0 +1,122 @@
+from time import monotonic
+
+from nio.util.threading import spawn
+
+
+def remap(values, old_idxs, default=None):
+    """ Reorder a per-query list after the queries of a block changed.
+
+    Args:
+        values (list): indexed like the queries before the change.
+        old_idxs (list): for each query, its index before the change or
+            None if it was added.
+        default: the value of added queries.
+
+    Returns:
+        values (list): indexed like the queries after the change.
+
+    """
+    return [default if old is None else values[old] for old in old_idxs]
+
+
+class QueryUpdates(object):
+
+    """ Block mixin for adding and removing queries of a running block.
+
+    Queries are matched before and after a change by their cursor key
+    (see CursorCheckpoint). Only added queries are resolved and
+    initialized; the others keep their cursors and scheduling, as every
+    mixin holding per-query lists remaps them in `_reindex_queries`.
+
+    Blocks expose `add_query` and `remove_query` as commands, and
+    `update_queries` replaces the whole list. Blocks override
+    `_apply_queries` to resolve the queries they poll.
+
+    Blocks whose queries are slow to resolve may call `_defer_queries`
+    while configuring instead: they start polling no query, and the
+    configured queries are applied by a warm-up thread once started, as
+    if they had all been added.
+
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._configured_queries = []
+        self._deferred = False
+        self._warm_up_thread = None
+
+    def configure(self, context):
+        super().configure(context)
+        self._configured_queries = list(self.queries())
+        self._deferred = False
+
+    def start(self):
+        super().start()
+        if self._deferred:
+            self._warm_up_thread = spawn(self._warm_up)
+
+    def add_query(self, query):
+        """ Command: start polling a query. """
+        query = self._parse_query(query)
+        keys = [self._query_key(q) for q in self._configured_queries]
+        if self._query_key(query) in keys:
+            return keys
+        return self.update_queries(self._configured_queries + [query])
+
+    def remove_query(self, query):
+        """ Command: stop polling a query. """
+        key = self._query_key(self._parse_query(query))
+        return self.update_queries([q for q in self._configured_queries
+                                    if self._query_key(q) != key])
+
+    def update_queries(self, queries):
+        """ Replace the configured queries of the block.
+
+        Waits for a running poll or polling cycle to finish first.
+
+        Returns:
+            queries (list(str)): keys of the configured queries.
+
+        """
+        with self._cycle_lock, self._poll_lock:
+            # Keep the cursors of removed queries should they come back.
+            self._checkpoint_cursors()
+            old_idxs = {key: idx for idx, key
+                        in enumerate(self._cursor_keys())}
+            self._configured_queries = list(queries)
+            self._apply_queries(self._configured_queries)
+            self._deferred = False
+            self._reindex_queries([old_idxs.get(key)
+                                   for key in self._cursor_keys()])
+        self.logger.info("Now polling {} queries".format(self._n_queries))
+        return [self._query_key(q) for q in self._configured_queries]
+
+    def _defer_queries(self):
+        """ Poll no query until `_warm_up` applies the configured ones. """
+        self._n_queries = 0
+        self._deferred = True
+
+    def _queries_deferred(self):
+        return self._deferred
+
+    def _warm_up(self):
+        started = monotonic()
+        try:
+            self.update_queries(self._configured_queries)
+        except Exception:
+            self.logger.exception("Failed to apply the configured queries")
+            return
+        self.logger.info("Applied the configured queries in {:.3f}s".format(
+            monotonic() - started))
+
+    def _apply_queries(self, queries):
+        """ Set the queries to poll from the configured queries. """
+        self.queries = queries
+        self._n_queries = len(self.queries())
+
+    def _parse_query(self, query):
+        """ Convert a query given to a command to a configured query. """
+        return query
+
+    def _query_key(self, query):
+        return str(query).lower()
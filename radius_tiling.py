@@ -0,0 +1,139 @@
+import heapq
+from collections import defaultdict, namedtuple
+from math import ceil, cos, degrees, floor, radians, sqrt
+
+EARTH_RADIUS = 6371000.0
+
+
+def distance(lat1, lng1, lat2, lng2):
+    """ Approximate distance in meters between two points.
+
+    Uses the equirectangular approximation, which is accurate to well
+    under a meter at the few kilometer scale of `media/search` circles.
+
+    """
+    dlng = (lng2 - lng1 + 180) % 360 - 180
+    x = radians(dlng) * cos(radians((lat1 + lat2) / 2))
+    y = radians(lat2 - lat1)
+    return EARTH_RADIUS * sqrt(x * x + y * y)
+
+
+class Circle(namedtuple('Circle', 'latitude longitude radius')):
+
+    """ A search area: a center in degrees and a radius in meters. """
+
+    def distance_to(self, latitude, longitude):
+        return distance(self.latitude, self.longitude, latitude, longitude)
+
+    def covers_point(self, latitude, longitude):
+        return self.distance_to(latitude, longitude) <= self.radius
+
+    def covers(self, other):
+        return self.distance_to(other.latitude, other.longitude) + \
+            other.radius <= self.radius
+
+    def overlaps(self, other):
+        return self.distance_to(other.latitude, other.longitude) < \
+            self.radius + other.radius
+
+
+def enclosing_circle(a, b):
+    """ The smallest circle covering both circles `a` and `b`. """
+    if a.covers(b):
+        return a
+    if b.covers(a):
+        return b
+    d = a.distance_to(b.latitude, b.longitude)
+    radius = (d + a.radius + b.radius) / 2
+    # Move from the center of a towards b so that a touches the result.
+    t = (radius - a.radius) / d
+    dlng = (b.longitude - a.longitude + 180) % 360 - 180
+    longitude = (a.longitude + t * dlng + 180) % 360 - 180
+    return Circle(a.latitude + t * (b.latitude - a.latitude), longitude,
+                  radius)
+
+
+def plan_tiles(circles, max_radius):
+    """ Cover a set of circles with fewer, merged search circles.
+
+    Overlapping circles are merged greedily, always taking the merge with
+    the smallest enclosing circle first, as long as the merged circle is
+    no larger than `max_radius`. Nested circles merge for free, and
+    circles that overlap nothing keep their own tile.
+
+    Args:
+        circles (list(Circle)): the locations to search.
+        max_radius (float): the largest radius the api accepts.
+
+    Returns:
+        tiles (list((Circle, list(int)))): each tile to search, with the
+            indexes of the circles it covers. Tile radii are rounded up
+            to whole meters.
+
+    """
+    tiles = {idx: (circle, [idx]) for idx, circle in enumerate(circles)}
+    candidates = []
+
+    def push_merges(key):
+        circle = tiles[key][0]
+        for other, (other_circle, _) in tiles.items():
+            if other == key or not circle.overlaps(other_circle):
+                continue
+            merged = enclosing_circle(circle, other_circle)
+            # Circles nested in an oversized one still merge into it.
+            if merged.radius <= max(max_radius, circle.radius,
+                                    other_circle.radius):
+                heapq.heappush(
+                    candidates, (merged.radius, key, other, merged))
+
+    for key in list(tiles):
+        push_merges(key)
+    next_key = len(circles)
+    while candidates:
+        _, a, b, merged = heapq.heappop(candidates)
+        if a not in tiles or b not in tiles:
+            # One side has been merged into another tile already.
+            continue
+        members = tiles.pop(a)[1] + tiles.pop(b)[1]
+        tiles[next_key] = (merged, sorted(members))
+        push_merges(next_key)
+        next_key += 1
+    return [(Circle(circle.latitude, circle.longitude, ceil(circle.radius)),
+             members) for circle, members in tiles.values()]
+
+
+class LocationIndex(object):
+
+    """ Grid index answering which circles cover a point.
+
+    Each circle is registered in every grid cell its bounding box
+    touches, so a lookup only tests the few circles of one cell.
+
+    Args:
+        circles (list(Circle)): the circles to index.
+        cell_size (float): grid cell size in meters.
+
+    """
+
+    def __init__(self, circles, cell_size=1000):
+        self._circles = list(circles)
+        self._cell = degrees(cell_size / EARTH_RADIUS)
+        self._cells = defaultdict(list)
+        for idx, circle in enumerate(self._circles):
+            dlat = degrees(circle.radius / EARTH_RADIUS)
+            # Circles are widest in longitude on their poleward edge.
+            dlng = dlat / max(
+                cos(radians(min(abs(circle.latitude) + dlat, 90))), 1e-6)
+            for row in self._span(circle.latitude, dlat):
+                for col in self._span(circle.longitude, dlng):
+                    self._cells[(row, col)].append(idx)
+
+    def _span(self, center, half_width):
+        return range(floor((center - half_width) / self._cell),
+                     floor((center + half_width) / self._cell) + 1)
+
+    def locate(self, latitude, longitude):
+        """ Indexes of the circles covering a point, in ascending order. """
+        key = (floor(latitude / self._cell), floor(longitude / self._cell))
+        return [idx for idx in self._cells.get(key, ())
+                if self._circles[idx].covers_point(latitude, longitude)]
@@ -0,0 +1,237 @@
+import asyncio
+from threading import Condition, Lock
+from time import monotonic
+
+from nio.properties import PropertyHolder, BoolProperty, FloatProperty, \
+    IntProperty, ObjectProperty
+from nio.util.logging import get_nio_logger
+
+from .concurrent_polling import PollSkipped
+
+
+class RequestBudget(object):
+
+    """ Token bucket for the hourly request limit of one client id.
+
+    The bucket holds up to `limit` tokens and refills at `limit` tokens
+    per `period` seconds. Every request takes a token, waiting for one if
+    the bucket is empty. Paging requests may only take tokens while more
+    than `paging_reserve` of the limit is left, so the first page of
+    every query keeps priority over deep paging chains.
+
+    The rate limit headers of each response reset the bucket to the
+    remaining count of the api, so every block sharing a client id shares
+    a single view of the remaining budget.
+
+    """
+
+    def __init__(self, limit=5000, period=3600, paging_reserve=0.2):
+        self.limit = limit
+        self.period = period
+        self.paging_reserve = paging_reserve
+        self._tokens = float(limit)
+        self._updated_at = monotonic()
+        self._cond = Condition(Lock())
+
+    @property
+    def tokens(self):
+        with self._cond:
+            self._refill()
+            return self._tokens
+
+    def allows_paging(self):
+        """ Whether a paging request would be served without waiting. """
+        return self.wait_time(paging=True) == 0
+
+    def wait_time(self, paging=False):
+        """ Seconds until a request can take a token, 0 if it can now. """
+        with self._cond:
+            self._refill()
+            missing = self._floor(paging) + 1 - self._tokens
+            return max(0, missing * self.period / self.limit)
+
+    def acquire(self, paging=False, timeout=None):
+        """ Take a token for a request, waiting until one is available.
+
+        Args:
+            paging (bool): the request follows a `next_url`.
+            timeout (float): max seconds to wait, None to wait as long as
+                it takes.
+
+        Returns:
+            acquired (bool): False if the timeout expired first.
+
+        """
+        deadline = None if timeout is None else monotonic() + timeout
+        floor = self._floor(paging)
+        with self._cond:
+            while True:
+                self._refill()
+                if self._tokens >= floor + 1:
+                    self._tokens -= 1
+                    return True
+                wait = (floor + 1 - self._tokens) * self.period / self.limit
+                if deadline is not None:
+                    wait = min(wait, deadline - monotonic())
+                    if wait <= 0:
+                        return False
+                self._cond.wait(wait)
+
+    def update(self, remaining=None, limit=None):
+        """ Correct the bucket from the api's rate limit headers. """
+        with self._cond:
+            self._refill()
+            if limit is not None:
+                self.limit = limit
+            if remaining is not None:
+                self._tokens = min(float(self.limit), float(remaining))
+            self._cond.notify_all()
+
+    def _floor(self, paging):
+        return self.limit * self.paging_reserve if paging else 0
+
+    def _refill(self):
+        now = monotonic()
+        self._tokens = min(
+            float(self.limit),
+            self._tokens + (now - self._updated_at) * self.limit / self.period)
+        self._updated_at = now
+
+
+_budgets = {}
+_budgets_lock = Lock()
+
+
+def get_budget(client_id, limit=5000, paging_reserve=0.2):
+    """ Get the process wide RequestBudget of a client id.
+
+    Blocks configured with the same limit and paging reserve share a
+    budget. Other settings get a budget of their own rather than changing
+    the one other blocks use, which is logged since the api still counts
+    their requests against a single limit.
+
+    """
+    key = (client_id, limit, paging_reserve)
+    with _budgets_lock:
+        budget = _budgets.get(key)
+        if budget is not None:
+            return budget
+        if any(other[0] == client_id for other in _budgets):
+            get_nio_logger("RequestBudget").warning(
+                "Client id {} is already budgeted with other rate limit "
+                "settings, keeping a separate budget".format(client_id))
+        budget = _budgets[key] = RequestBudget(
+            limit, paging_reserve=paging_reserve)
+        return budget
+
+
+class RateLimitOptions(PropertyHolder):
+    enabled = BoolProperty(title='Enabled', default=False)
+    requests_per_hour = IntProperty(title='Requests per Hour', default=5000)
+    paging_reserve = FloatProperty(title='Reserve for New Queries',
+                                   default=0.2)
+
+
+class RateLimitBudget(object):
+
+    """ Block mixin that spends requests from a shared hourly budget.
+
+    Requests wait for the budget of their client id instead of failing
+    with a rate limit error and going through `_retry`, and paging stops
+    early when the budget runs low. A poll waits at most one polling
+    interval, then it is skipped until the next one. Blocks must
+    implement `_client_ids` and `_client_id`, the client id of the
+    current query, see CredentialSharding.
+
+    Polling responses update the budget once, from `_process_response`
+    when they succeed and from `_query_failed` when they fail, whatever
+    made the request. Other requests update it from `_http_get`.
+
+    """
+
+    rate_limit = ObjectProperty(RateLimitOptions, title='Rate Limit')
+
+    def __init__(self):
+        super().__init__()
+        self._budget = None
+        self._budgets = {}
+
+    def configure(self, context):
+        super().configure(context)
+        options = self.rate_limit()
+        self._budget, self._budgets = None, {}
+        if not options.enabled():
+            return
+        for client_id in self._client_ids():
+            self._budgets[client_id] = get_budget(
+                client_id, options.requests_per_hour(),
+                options.paging_reserve())
+        self._budget = self._budgets[self._client_ids()[0]]
+
+    def _query_budget(self):
+        """ The budget of the current query's client id, if enabled. """
+        if len(self._budgets) > 1:
+            return self._budgets.get(self._client_id(), self._budget)
+        return self._budget
+
+    def _acquire_budget(self, paging=False):
+        """ Take a token for a request, waiting at most one polling
+        interval for it.
+
+        Raises:
+            PollSkipped: if the budget is still exhausted by then.
+
+        """
+        budget = self._query_budget()
+        if budget is None or budget.acquire(paging, timeout=0):
+            return
+        self.logger.info("Rate limit budget is low, waiting")
+        if not budget.acquire(
+                paging, timeout=self.polling_interval().total_seconds()):
+            raise PollSkipped("rate limit budget is exhausted")
+
+    async def _wait_for_budget(self, paging=False):
+        """ Take a token for a request without blocking an asyncio event
+        loop, awaiting one if the budget is low.
+
+        """
+        budget = self._query_budget()
+        while budget is not None and not budget.acquire(paging, timeout=0):
+            await asyncio.sleep(budget.wait_time(paging))
+
+    def _budget_allows_paging(self):
+        budget = self._query_budget()
+        return budget is None or budget.allows_paging()
+
+    def _update_budget(self, resp):
+        """ Read the rate limit headers of a response into the budget. """
+        budget = self._query_budget()
+        if budget is None or resp is None:
+            return
+        headers = getattr(resp, 'headers', None) or {}
+        remaining = headers.get('X-Ratelimit-Remaining')
+        limit = headers.get('X-Ratelimit-Limit')
+        if getattr(resp, 'status_code', None) == 429:
+            remaining = 0
+        try:
+            budget.update(
+                None if remaining is None else int(remaining),
+                None if limit is None else int(limit))
+        except (TypeError, ValueError):
+            pass
+
+    def _query_failed(self, resp=None):
+        self._update_budget(resp)
+        super()._query_failed(resp)
+
+    def _fetch_page(self, url, **kwargs):
+        # Polling requests take their token in _prepare_url.
+        return super()._fetch_page(url, budgeted=True, **kwargs)
+
+    def _http_get(self, url, budgeted=False, **kwargs):
+        if budgeted:
+            return super()._http_get(url, **kwargs)
+        self._acquire_budget()
+        resp = super()._http_get(url, **kwargs)
+        self._update_budget(resp)
+        return resp
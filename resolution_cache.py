@@ -0,0 +1,122 @@
+import json
+import os
+from collections import OrderedDict
+from threading import Lock
+from time import time
+
+from nio.util.logging import get_nio_logger
+
+
+class ResolutionCache(object):
+
+    """ Bounded cache of query -> Instagram id resolutions.
+
+    Entries expire after `ttl` seconds and the least recently used entry
+    is evicted once `max_size` entries are cached. When `path` is set the
+    cache is loaded from and saved to that JSON file, so resolutions
+    survive a restart.
+
+    Use `get_cache` to share one cache between every block that points at
+    the same file.
+
+    """
+
+    def __init__(self, path=None, ttl=604800, max_size=10000):
+        self.path = path
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = Lock()
+        self.logger = get_nio_logger("ResolutionCache")
+        self._load()
+
+    def get(self, key):
+        """ Return the cached id for `key`, or None if missing or expired. """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return
+            _id, resolved_at = entry
+            if time() - resolved_at > self.ttl:
+                del self._entries[key]
+                return
+            self._entries.move_to_end(key)
+            return _id
+
+    def set(self, key, _id):
+        with self._lock:
+            self._entries[key] = (_id, time())
+            self._entries.move_to_end(key)
+            self._evict()
+
+    def save(self):
+        """ Write the cache to `path`, if the cache is file backed. """
+        if not self.path:
+            return
+        with self._lock:
+            entries = list(self._entries.items())
+        tmp_path = "{}.tmp".format(self.path)
+        with open(tmp_path, 'w') as f:
+            json.dump(entries, f)
+        os.replace(tmp_path, self.path)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _evict(self):
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path) as f:
+                entries = json.load(f)
+            now = time()
+            loaded = OrderedDict(
+                (key, (_id, resolved_at)) for key, (_id, resolved_at)
+                in entries if now - resolved_at <= self.ttl)
+        except (OSError, ValueError, TypeError, AttributeError) as e:
+            # An unreadable or corrupt cache file is just a cold cache.
+            self.logger.warning(
+                "Ignoring id cache file {}: {}".format(self.path, e))
+            return
+        self._entries.update(loaded)
+        self._evict()
+
+
+_caches = {}
+_caches_lock = Lock()
+
+
+def get_cache(path=None, ttl=604800, max_size=10000):
+    """ Get the process wide ResolutionCache for `path`.
+
+    Args:
+        path (str): JSON file backing the cache, None for memory only.
+        ttl (float): seconds a resolution stays valid.
+        max_size (int): max number of cached resolutions.
+
+    Returns:
+        cache (ResolutionCache)
+
+    """
+    path = path or None
+    with _caches_lock:
+        cache = _caches.get(path)
+        if cache is None:
+            cache = _caches[path] = ResolutionCache(path, ttl, max_size)
+        else:
+            cache.ttl = ttl
+            cache.max_size = max_size
+        return cache
+
+
+def reset_caches():
+    """ Forget every cache returned by `get_cache`, such as between
+    tests.
+
+    """
+    with _caches_lock:
+        _caches.clear()
@@ -0,0 +1,96 @@
+from threading import Lock
+
+from nio.modules.scheduler import Job
+from nio.properties import PropertyHolder, BoolProperty, IntProperty, \
+    ObjectProperty, TimeDeltaProperty
+
+
+class SignalBatcher(object):
+
+    """ Merge small lists of signals into fewer, larger ones.
+
+    Signals are buffered per output and notified in lists of `max_size`
+    as soon as that many are buffered, or once the oldest buffered
+    signal has waited `max_latency`, whichever comes first.
+
+    Args:
+        notify (callable): called with a list of signals and an output id.
+        max_size (int): largest list of signals to notify.
+        max_latency (timedelta): longest a signal is held back.
+
+    """
+
+    def __init__(self, notify, max_size, max_latency):
+        self.max_size = max_size
+        self.max_latency = max_latency
+        self._notify = notify
+        self._buffers = {}
+        self._flush_job = None
+        self._lock = Lock()
+
+    def add(self, signals, output_id=None):
+        batches = []
+        with self._lock:
+            buffer = self._buffers.setdefault(output_id, [])
+            buffer.extend(signals)
+            while len(buffer) >= self.max_size:
+                batches.append(buffer[:self.max_size])
+                del buffer[:self.max_size]
+            if buffer and self._flush_job is None:
+                self._flush_job = Job(self.flush, self.max_latency, False)
+        for batch in batches:
+            self._notify(batch, output_id)
+
+    def flush(self):
+        """ Notify every buffered signal now. """
+        with self._lock:
+            buffers, self._buffers = self._buffers, {}
+            if self._flush_job is not None:
+                self._flush_job.cancel()
+                self._flush_job = None
+        for output_id, signals in buffers.items():
+            if signals:
+                self._notify(signals, output_id)
+
+
+class BatchOptions(PropertyHolder):
+    enabled = BoolProperty(title='Enabled', default=False)
+    max_size = IntProperty(title='Max Signals per List', default=500)
+    max_latency = TimeDeltaProperty(title='Max Latency',
+                                    default={"seconds": 1})
+
+
+class SignalBatching(object):
+
+    """ Block mixin that notifies signals in batches across queries.
+
+    Every page and polling cycle notifies its own list of signals. With
+    `output_batching` enabled, those lists are merged until `max_size`
+    signals are waiting or the oldest has waited `max_latency`, so busy
+    blocks notify fewer, larger lists while quiet ones stay responsive.
+    Buffered signals are notified when the block stops.
+
+    """
+
+    output_batching = ObjectProperty(BatchOptions, title='Output Batching')
+
+    def __init__(self):
+        super().__init__()
+        self._batcher = None
+
+    def configure(self, context):
+        super().configure(context)
+        options = self.output_batching()
+        self._batcher = SignalBatcher(
+            super().notify_signals, options.max_size(),
+            options.max_latency()) if options.enabled() else None
+
+    def stop(self):
+        if self._batcher is not None:
+            self._batcher.flush()
+        super().stop()
+
+    def notify_signals(self, signals, output_id=None):
+        if self._batcher is None:
+            return super().notify_signals(signals, output_id)
+        self._batcher.add(signals, output_id)
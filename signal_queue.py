@@ -0,0 +1,208 @@
+from collections import deque
+from enum import Enum
+from threading import Condition, Lock
+from time import monotonic
+
+from nio.properties import PropertyHolder, BoolProperty, IntProperty, \
+    ObjectProperty, SelectProperty
+from nio.util.threading import spawn
+
+
+class QueuePolicy(Enum):
+    pause_paging = 'pause_paging'
+    drop_oldest = 'drop_oldest'
+    block = 'block'
+
+
+class SignalQueue(object):
+
+    """ Bounded FIFO of signal lists between polling and notifying.
+
+    Capacity counts signals rather than lists. When a list does not fit:
+
+    - `block` waits until it does, so polling slows to the pace of the
+      consumer.
+    - `drop_oldest` drops the oldest queued signals to make room.
+    - `pause_paging` queues it anyway, and pollers are expected to check
+      `full` and stop paging until the queue drains.
+
+    """
+
+    def __init__(self, capacity, policy=QueuePolicy.pause_paging):
+        self.capacity = max(1, capacity)
+        self.policy = policy
+        self.depth = 0
+        self.max_depth = 0
+        self.dropped = 0
+        self.blocked = 0.0
+        self._items = deque()
+        self._closed = False
+        self._cond = Condition(Lock())
+
+    @property
+    def full(self):
+        return self.depth >= self.capacity
+
+    def put(self, signals, output_id=None):
+        with self._cond:
+            if self.policy is QueuePolicy.block:
+                started = monotonic()
+                # A list larger than the queue goes in once it is empty.
+                while self.depth and not self._closed and \
+                        self.depth + len(signals) > self.capacity:
+                    self._cond.wait()
+                self.blocked += monotonic() - started
+            elif self.policy is QueuePolicy.drop_oldest:
+                if len(signals) > self.capacity:
+                    self.dropped += len(signals) - self.capacity
+                    signals = signals[-self.capacity:]
+                self._drop(self.depth + len(signals) - self.capacity)
+            self._items.append((signals, output_id))
+            self.depth += len(signals)
+            self.max_depth = max(self.max_depth, self.depth)
+            self._cond.notify_all()
+
+    def get(self):
+        """ Wait for the oldest list of signals.
+
+        Returns:
+            item (tuple): the signals and their output id, None once the
+                queue is closed and empty.
+
+        """
+        with self._cond:
+            while not self._items:
+                if self._closed:
+                    return None
+                self._cond.wait()
+            signals, output_id = self._items.popleft()
+            self.depth -= len(signals)
+            self._cond.notify_all()
+            return signals, output_id
+
+    def close(self):
+        """ Let `get` return None once the queued signals are taken. """
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            return {
+                'depth': self.depth,
+                'max_depth': self.max_depth,
+                'capacity': self.capacity,
+                'dropped': self.dropped,
+                'blocked_seconds': self.blocked,
+            }
+
+    def _drop(self, count):
+        while count > 0 and self._items:
+            signals, output_id = self._items[0]
+            if len(signals) <= count:
+                self._items.popleft()
+                dropped = len(signals)
+            else:
+                self._items[0] = (signals[count:], output_id)
+                dropped = count
+            count -= dropped
+            self.depth -= dropped
+            self.dropped += dropped
+
+
+class QueueOptions(PropertyHolder):
+    enabled = BoolProperty(title='Enabled', default=False)
+    capacity = IntProperty(title='Capacity (signals)', default=5000)
+    policy = SelectProperty(QueuePolicy, title='When Full',
+                            default=QueuePolicy.pause_paging)
+
+
+class QueuedEmission(object):
+
+    """ Block mixin that notifies signals from a bounded queue.
+
+    With the `signal_queue` enabled, polling queues its signals and a
+    single emitter thread notifies them, so a slow consumer no longer
+    holds up requests. The queue policy decides what happens when the
+    consumer falls behind; with `pause_paging`, blocks stop paging while
+    the queue is full and keep the `next_url` of the query, which resumes
+    from it on its next poll. The queue depth, drops and time spent
+    blocked are part of the block metrics.
+
+    Blocks call `_queue_allows_paging` and `_pause_paging` when paging.
+
+    """
+
+    signal_queue = ObjectProperty(QueueOptions, title='Signal Queue')
+
+    STOP_TIMEOUT = 10
+
+    def __init__(self):
+        super().__init__()
+        self._queue = None
+        self._emitter = None
+        # next_url to resume each paused query from, by query index
+        self._paused_urls = {}
+
+    def configure(self, context):
+        super().configure(context)
+        options = self.signal_queue()
+        self._queue = SignalQueue(options.capacity(), options.policy()) \
+            if options.enabled() else None
+        self._paused_urls = {}
+
+    def start(self):
+        super().start()
+        if self._queue is not None:
+            self._emitter = spawn(self._emit_signals)
+
+    def stop(self):
+        if self._emitter is not None:
+            # Notify what is queued before stopping.
+            self._queue.close()
+            self._emitter.join(self.STOP_TIMEOUT)
+            self._emitter = None
+        super().stop()
+
+    def metrics(self):
+        metrics = super().metrics()
+        if self._queue is not None:
+            metrics['signal_queue'] = self._queue.stats()
+        return metrics
+
+    def notify_signals(self, signals, output_id=None):
+        if self._emitter is None:
+            return super().notify_signals(signals, output_id)
+        self._queue.put(signals, output_id)
+
+    def _emit_signals(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            try:
+                super().notify_signals(*item)
+            except Exception:
+                self.logger.exception("Failed to notify queued signals")
+
+    def _queue_allows_paging(self):
+        return self._queue is None or \
+            self._queue.policy is not QueuePolicy.pause_paging or \
+            not self._queue.full
+
+    def _pause_paging(self, next_url):
+        """ Resume the current query from `next_url` on its next poll. """
+        self._paused_urls[self._idx] = next_url
+
+    def _resume_paging(self):
+        url = self._paused_urls.pop(self._idx, None)
+        if url is None:
+            return super()._resume_paging()
+        self.url = url
+        return True
+
+    def _reindex_queries(self, old_idxs):
+        super()._reindex_queries(old_idxs)
+        self._paused_urls = {
+            idx: self._paused_urls[old] for idx, old in enumerate(old_idxs)
+            if old in self._paused_urls}
@@ -0,0 +1,49 @@
+from unittest import TestCase
+
+from ..adaptive_schedule import AdaptiveSchedule
+
+
+class TestAdaptiveSchedule(TestCase):
+
+    def test_due(self):
+        schedule = AdaptiveSchedule(2, min_interval=10, max_interval=100)
+        self.assertTrue(schedule.due(0, now=0))
+        schedule.observe(0, 20, now=0)
+        self.assertFalse(schedule.due(0, now=5))
+        self.assertTrue(schedule.due(0, now=10))
+        self.assertTrue(schedule.due(1, now=5))
+
+    def test_busy_query(self):
+        schedule = AdaptiveSchedule(1, min_interval=10, max_interval=100,
+                                    target_posts=20)
+        # 400 posts in 10 seconds, expect 20 more within a second
+        schedule.observe(0, 400, now=0)
+        self.assertEqual(10, schedule.interval(0))
+
+    def test_quiet_query(self):
+        schedule = AdaptiveSchedule(1, min_interval=10, max_interval=100,
+                                    target_posts=20)
+        now = 0
+        for _ in range(5):
+            schedule.observe(0, 0, now=now)
+            now += schedule.interval(0)
+        self.assertEqual(100, schedule.interval(0))
+
+    def test_velocity(self):
+        schedule = AdaptiveSchedule(1, min_interval=1, max_interval=1000,
+                                    target_posts=20, smoothing=1)
+        schedule.observe(0, 10, now=0)
+        # 5 posts in 50 seconds: 20 posts expected in 200 seconds
+        schedule.observe(0, 5, now=50)
+        self.assertAlmostEqual(200, schedule.interval(0))
+
+    def test_reindex(self):
+        schedule = AdaptiveSchedule(2, min_interval=10, max_interval=100)
+        schedule.observe(0, 0, now=0)
+        schedule.observe(1, 0, now=0)
+        # the first query is removed and a new one added
+        schedule.reindex([1, None])
+        self.assertEqual(20, schedule.interval(0))
+        self.assertFalse(schedule.due(0, now=10))
+        self.assertEqual(10, schedule.interval(1))
+        self.assertTrue(schedule.due(1, now=0))
@@ -0,0 +1,42 @@
+from collections import Counter
+from unittest import TestCase
+
+from ..credential_pool import CredentialPool
+
+
+class TestCredentialPool(TestCase):
+
+    def test_stable_assignment(self):
+        pool = CredentialPool(["a", "b", "c", "a", ""])
+        self.assertEqual(["a", "b", "c"], pool.client_ids)
+        keys = ["query{}".format(i) for i in range(300)]
+        assigned = {key: pool.assign(key) for key in keys}
+        self.assertEqual(assigned, {key: CredentialPool(
+            ["c", "b", "a"]).assign(key) for key in keys})
+        # spread evenly
+        for count in Counter(assigned.values()).values():
+            self.assertGreater(count, 60)
+        # a new client id only takes queries from the others
+        bigger = CredentialPool(["a", "b", "c", "d"])
+        for key in keys:
+            self.assertIn(bigger.assign(key), (assigned[key], "d"))
+
+    def test_bench(self):
+        pool = CredentialPool(["a", "b", "c"], cooldown=10)
+        keys = ["query{}".format(i) for i in range(100)]
+        assigned = {key: pool.assign(key, now=0) for key in keys}
+        pool.bench("a", now=0)
+        for key in keys:
+            client_id = pool.assign(key, now=5)
+            self.assertNotEqual("a", client_id)
+            if assigned[key] != "a":
+                self.assertEqual(assigned[key], client_id)
+        # queries go back once the cooldown is over
+        self.assertEqual(assigned, {key: pool.assign(key, now=10)
+                                    for key in keys})
+
+    def test_all_benched(self):
+        pool = CredentialPool(["a", "b"])
+        pool.bench("a", 20, now=0)
+        pool.bench("b", 10, now=0)
+        self.assertEqual("b", pool.assign("query", now=5))
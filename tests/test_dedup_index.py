@@ -0,0 +1,42 @@
+from unittest import TestCase
+from unittest.mock import patch
+
+from ..dedup_index import SeenSet, SeenBloomFilter
+
+
+class TestSeenIndex(TestCase):
+
+    def test_exact(self):
+        index = SeenSet(capacity=10)
+        self.assertTrue(index.add("1"))
+        self.assertFalse(index.add("1"))
+        self.assertTrue(index.add("2"))
+
+    def test_bloom(self):
+        index = SeenBloomFilter(capacity=1000)
+        added = [index.add(str(i)) for i in range(1000)]
+        self.assertTrue(all(added))
+        self.assertFalse(any(index.add(str(i)) for i in range(1000)))
+
+    def test_rotates_on_capacity(self):
+        for index in (SeenSet(capacity=2), SeenBloomFilter(capacity=2)):
+            index.add("1")
+            index.add("2")
+            # "1" and "2" move to the previous generation
+            index.add("3")
+            self.assertFalse(index.add("1"))
+            index.add("4")
+            # the generation holding "1" and "2" is forgotten
+            index.add("5")
+            self.assertTrue(index.add("2"))
+
+    @patch("{}.time".format(SeenSet.__module__))
+    def test_rotates_on_window(self, mock_time):
+        mock_time.return_value = 0
+        index = SeenSet(capacity=100, window=10)
+        index.add("1")
+        mock_time.return_value = 10
+        index.add("2")
+        self.assertFalse(index.add("1"))
+        mock_time.return_value = 20
+        self.assertTrue(index.add("1"))
@@ -0,0 +1,24 @@
+from unittest import TestCase
+
+from ..freshness import split_fresh
+
+
+class TestFreshness(TestCase):
+
+    def test_split_fresh(self):
+        posts = [{"id": "1", "created_time": "100"},
+                 {"id": "2", "created_time": "300"},
+                 {"id": "3", "created_time": "200"}]
+        fresh, freshest = split_fresh(posts, 150)
+        self.assertEqual(["2", "3"], [p["id"] for p in fresh])
+        self.assertEqual(300, freshest)
+
+    def test_nothing_fresh(self):
+        posts = [{"created_time": "100"}, {"created_time": "150"}]
+        self.assertEqual(([], 150), split_fresh(posts, 150))
+        self.assertEqual(([], 150), split_fresh([], 150))
+
+    def test_field(self):
+        fresh, freshest = split_fresh([{"taken_at": 5}], 0, "taken_at")
+        self.assertEqual(1, len(fresh))
+        self.assertEqual(5, freshest)
@@ -0,0 +1,41 @@
+from unittest import TestCase
+
+from ..geofence import Geofence, GeofenceSet
+
+
+def post(latitude, longitude):
+    return {"location": {"latitude": latitude, "longitude": longitude}}
+
+
+class TestGeofence(TestCase):
+
+    def test_box(self):
+        fence = Geofence([(40.8, -73.9), (40.7, -74.0)])
+        self.assertTrue(fence.is_box)
+        self.assertEqual((40.7, -74.0, 40.8, -73.9), fence.bounds)
+        self.assertTrue(fence.contains(40.75, -73.95))
+        self.assertFalse(fence.contains(40.85, -73.95))
+
+    def test_polygon(self):
+        # a triangle with its right angle at the origin
+        fence = Geofence([(0, 0), (0, 10), (10, 0)])
+        self.assertTrue(fence.contains(2, 2))
+        self.assertFalse(fence.contains(6, 6))
+        self.assertFalse(fence.contains(-1, 2))
+        # concave: an L shape
+        fence = Geofence([(0, 0), (0, 10), (2, 10), (2, 2), (10, 2),
+                          (10, 0)])
+        self.assertTrue(fence.contains(1, 8))
+        self.assertTrue(fence.contains(8, 1))
+        self.assertFalse(fence.contains(5, 5))
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            Geofence([(0, 0)])
+
+    def test_filter(self):
+        fences = GeofenceSet([Geofence([(0, 0), (0, 10), (10, 0)]),
+                              Geofence([(20, 20), (30, 30)])])
+        posts = [post(2, 2), post(6, 6), post(25, 25), post(15, 15),
+                 {"id": "no location"}, post("bad", 0)]
+        self.assertEqual([posts[0], posts[2]], fences.filter(posts))
@@ -1,10 +1,13 @@
-from threading import Event
-from unittest.mock import patch, Mock
+import json
+from threading import Event, current_thread
+from unittest.mock import patch, Mock, AsyncMock
 
+from nio.block.terminals import DEFAULT_TERMINAL
 from nio.testing.block_test_case import NIOBlockTestCase
 from nio.util.discovery import not_discoverable
 
 from ..rest_polling.rest_block import RESTPolling
+from ..async_polling import AsyncPolling, AsyncResponse
 from ..instagram_block import Instagram
 
 
@@ -24,7 +27,7 @@ class TestInstagram(NIOBlockTestCase):
 
     @patch.object(RESTPolling, "_retry")
     @patch.object(RESTPolling, "_authenticate")
-    @patch("requests.get")
+    @patch("requests.Session.get")
     def test_private_user(self, mock_get, mock_auth, mock_retry):
         e = Event()
         blk = InstagramEpilogueEvent(e)
@@ -44,3 +47,479 @@ class TestInstagram(NIOBlockTestCase):
         blk.poll()
         e.wait(2)
         self.assertEqual(blk.page_num, blk.polling_interval().total_seconds())
+
+    @patch.object(RESTPolling, "_retry")
+    @patch.object(RESTPolling, "_authenticate")
+    @patch("requests.Session.get")
+    def test_concurrent_polling(self, mock_get, mock_auth, mock_retry):
+        blk = Instagram()
+        self.configure_block(blk, {
+            "queries": [
+                "hashtag1",
+                "hashtag2",
+                "hashtag3"
+            ],
+            "concurrent_polling": True,
+            "max_concurrency": 2
+        })
+        mock_get.return_value = Mock()
+        mock_get.return_value.status_code = 200
+        mock_get.return_value.json.return_value = \
+            {
+                "data": [{"id": "1"}],
+                "pagination": {"min_tag_id": "5"}
+            }
+        with patch.object(blk, "notify_signals") as mock_notify:
+            blk.poll()
+        # one list of signals for the whole cycle, one post per query
+        self.assertEqual(1, mock_notify.call_count)
+        self.assertEqual(3, len(mock_notify.call_args[0][0]))
+        # every query kept its own cursor
+        self.assertEqual(["5", "5", "5"], blk._min_tag_id)
+        self.assertEqual(0, blk._idx)
+
+    @patch.object(RESTPolling, "_retry")
+    @patch.object(RESTPolling, "_authenticate")
+    @patch("requests.Session.get")
+    def test_metrics(self, mock_get, mock_auth, mock_retry):
+        blk = Instagram()
+        self.configure_block(blk, {
+            "queries": ["hashtag1", "hashtag2"],
+            "concurrent_polling": True,
+            "max_concurrency": 1
+        })
+        blk._min_tag_id = ["1", "1"]
+        first_page = Mock(status_code=200)
+        first_page.json.return_value = {
+            "data": [{"id": "1"}],
+            "pagination": {"min_tag_id": "2", "next_url": "next"}
+        }
+        last_page = Mock(status_code=200)
+        last_page.json.return_value = {
+            "data": [], "pagination": {"min_tag_id": "2"}}
+        failed = Mock(status_code=500)
+        mock_get.side_effect = [first_page, last_page, failed]
+        blk.poll()
+        metrics = blk.metrics()
+        self.assertEqual({"polls": 1, "pages": 1, "posts": 1},
+                         metrics["hashtag1"]["counters"])
+        self.assertEqual(2, metrics["hashtag1"]["latency"]["request"]["count"])
+        self.assertIsNotNone(metrics["hashtag1"]["cursor_age"])
+        self.assertEqual({"polls": 1, "failures": 1},
+                         metrics["hashtag2"]["counters"])
+        self.assertIsNone(metrics["hashtag2"]["cursor_age"])
+        blk._report_metrics()
+        self.assertEqual(["hashtag1", "hashtag2"], sorted(
+            s.query for s in self.notified_signals["metrics"][-1]))
+
+    @patch.object(RESTPolling, "_retry")
+    @patch.object(RESTPolling, "_authenticate")
+    @patch("requests.Session.get")
+    def test_signal_queue_pauses_paging(self, mock_get, mock_auth,
+                                        mock_retry):
+        blk = Instagram()
+        self.configure_block(blk, {
+            "queries": ["hashtag1"],
+            "concurrent_polling": True,
+            "signal_queue": {"enabled": True, "capacity": 1}
+        })
+        blk._min_tag_id = ["1"]
+        first_page = Mock(status_code=200)
+        first_page.json.return_value = {
+            "data": [{"id": "1"}],
+            "pagination": {"min_tag_id": "2", "next_url": "next"}
+        }
+        last_page = Mock(status_code=200)
+        last_page.json.return_value = {
+            "data": [{"id": "2"}], "pagination": {"min_tag_id": "2"}}
+        mock_get.side_effect = [first_page, last_page]
+        blk._queue.put(["backlog"])
+        blk.poll()
+        # the queue is full, so the next page waits for the next poll
+        self.assertEqual(1, mock_get.call_count)
+        self.assertEqual({0: "next"}, blk._paused_urls)
+        metrics = blk.metrics()
+        self.assertEqual(1, metrics["hashtag1"]["counters"]["queue_pauses"])
+        self.assertEqual(1, metrics["signal_queue"]["depth"])
+        blk._queue.get()
+        blk.poll()
+        # the paging chain resumes with its own min_tag_id
+        self.assertEqual("next&min_tag_id=1", mock_get.call_args[0][0])
+        self.assertEqual({}, blk._paused_urls)
+        self.assertEqual([["1"], ["2"]], [
+            [s.id for s in signals]
+            for signals in self.notified_signals[DEFAULT_TERMINAL]])
+        # once started, signals are notified from the queue
+        blk.start()
+        blk.notify_signals(["queued"])
+        blk.stop()
+        self.assertEqual(["queued"],
+                         self.notified_signals[DEFAULT_TERMINAL][-1])
+
+    @patch.object(RESTPolling, "_retry")
+    @patch.object(RESTPolling, "_authenticate")
+    @patch("requests.Session.get")
+    def test_conditional_requests(self, mock_get, mock_auth, mock_retry):
+        blk = Instagram()
+        self.configure_block(blk, {
+            "queries": ["hashtag1"],
+            "concurrent_polling": True,
+            "conditional_requests": True
+        })
+        blk._min_tag_id = ["1"]
+        body = {"data": [{"id": "1"}], "pagination": {"min_tag_id": "1"}}
+        resp = Mock(status_code=200, headers={"ETag": "v1"},
+                    content=json.dumps(body).encode())
+        resp.json.return_value = body
+        not_modified = Mock(status_code=304, headers={})
+        mock_get.side_effect = [resp, not_modified, resp]
+        with patch.object(blk, "notify_signals") as mock_notify:
+            blk.poll()
+            self.assertEqual(1, mock_notify.call_count)
+            # the validator of the first response is sent back
+            blk.poll()
+            self.assertEqual(
+                "v1", mock_get.call_args[1]["headers"]["If-None-Match"])
+            # the same body again is not processed
+            blk.poll()
+            self.assertEqual(1, mock_notify.call_count)
+        self.assertEqual(3, mock_get.call_count)
+        self.assertEqual(1, resp.json.call_count)
+
+    @patch.object(RESTPolling, "_retry")
+    @patch.object(RESTPolling, "_authenticate")
+    @patch("requests.Session.get")
+    def test_sequential_conditional_requests(self, mock_get, mock_auth,
+                                             mock_retry):
+        blk = Instagram()
+        self.configure_block(blk, {
+            "queries": ["hashtag1"],
+            "conditional_requests": True
+        })
+        blk._min_tag_id = ["1"]
+        body = {"data": [{"id": "1"}], "pagination": {"min_tag_id": "1"}}
+        resp = Mock(status_code=200, headers={"ETag": "v1"},
+                    content=json.dumps(body).encode())
+        resp.json.return_value = body
+        not_modified = Mock(status_code=304, headers={})
+        mock_get.side_effect = [resp, not_modified]
+        with patch.object(blk, "notify_signals") as mock_notify:
+            blk.poll()
+            self.assertEqual({}, mock_get.call_args[1]["headers"])
+            # RESTPolling sends the headers returned by _prepare_url
+            blk.poll()
+            self.assertEqual(
+                "v1", mock_get.call_args[1]["headers"]["If-None-Match"])
+        self.assertEqual(1, mock_notify.call_count)
+        self.assertEqual(1, resp.json.call_count)
+
+    @patch.object(RESTPolling, "_retry")
+    @patch.object(RESTPolling, "_authenticate")
+    @patch("requests.Session.get")
+    def test_initialize_from_persisted_min_tag_ids(self, mock_get,
+                                                   mock_auth, mock_retry):
+        blk = Instagram()
+        self.configure_block(blk, {
+            "queries": [
+                "Hashtag1",
+                "hashtag2"
+            ]
+        })
+        blk._cursors = {"hashtag1": {"_min_tag_id": "42"}}
+        mock_get.return_value = Mock()
+        mock_get.return_value.status_code = 200
+        mock_get.return_value.json.return_value = \
+            {
+                "data": [],
+                "pagination": {"min_tag_id": "50"}
+            }
+        blk._min_tag_id_pending = [True, True]
+        self.assertFalse(blk._query_ready(0))
+        blk._initialize_all_min_tag_ids()
+        # one request to verify the persisted min_tag_id, two to bootstrap
+        self.assertEqual(3, mock_get.call_count)
+        self.assertEqual(["42", "50"], blk._min_tag_id)
+        self.assertEqual({"_min_tag_id": "42", "_prev_min_tag_id": None},
+                         blk._cursors["hashtag1"])
+        self.assertTrue(blk._query_ready(0))
+        self.assertTrue(blk._query_ready(1))
+
+    @patch(Instagram.__module__ + ".spawn", side_effect=lambda f, *a: f(*a))
+    @patch.object(RESTPolling, "_retry")
+    @patch.object(RESTPolling, "_authenticate")
+    @patch("requests.Session.get")
+    def test_update_queries(self, mock_get, mock_auth, mock_retry,
+                            mock_spawn):
+        blk = Instagram()
+        self.configure_block(blk, {
+            "queries": [
+                "hashtag1",
+                "hashtag2"
+            ]
+        })
+        blk._min_tag_id = ["10", "20"]
+        blk._min_tag_id_pending = [False, False]
+        blk._idx = 1
+        mock_get.return_value = Mock()
+        mock_get.return_value.status_code = 200
+        mock_get.return_value.json.return_value = \
+            {
+                "data": [],
+                "pagination": {"min_tag_id": "50"}
+            }
+        blk.add_query("Hashtag3")
+        # only the added hashtag is initialized
+        self.assertEqual(2, mock_get.call_count)
+        self.assertIn("/tags/Hashtag3/", mock_get.call_args[0][0])
+        self.assertEqual(["10", "20", "50"], blk._min_tag_id)
+        self.assertTrue(blk._query_ready(2))
+        blk.remove_query("hashtag1")
+        self.assertEqual(["hashtag2", "Hashtag3"], blk.queries())
+        self.assertEqual(["20", "50"], blk._min_tag_id)
+        self.assertEqual(2, blk._n_queries)
+        # polling carries on with the same hashtag
+        self.assertEqual(0, blk._idx)
+
+    @patch.object(RESTPolling, "_retry")
+    @patch.object(RESTPolling, "_authenticate")
+    @patch("requests.Session.get")
+    def test_deduplication(self, mock_get, mock_auth, mock_retry):
+        blk = Instagram()
+        self.configure_block(blk, {
+            "queries": [
+                "hashtag1",
+                "hashtag2"
+            ],
+            "concurrent_polling": True,
+            "deduplication": {"enabled": True}
+        })
+        blk._min_tag_id = ["5", "5"]
+        mock_get.return_value = Mock()
+        mock_get.return_value.status_code = 200
+        mock_get.return_value.json.return_value = \
+            {
+                "data": [{"id": "1"}, {"id": "2"}],
+                "pagination": {"min_tag_id": "5"}
+            }
+        with patch.object(blk, "notify_signals") as mock_notify:
+            blk.poll()
+        # both hashtags return the same two posts
+        self.assertEqual(2, len(mock_notify.call_args[0][0]))
+        # counted against whichever hashtag returned them second
+        self.assertEqual(2, sum(
+            metrics["counters"].get("duplicates", 0)
+            for metrics in blk.metrics().values()))
+
+    @patch.object(RESTPolling, "_authenticate")
+    def test_stream_responses(self, mock_auth):
+        blk = Instagram()
+        self.configure_block(blk, {
+            "queries": ["hashtag1"],
+            "stream_responses": True,
+            "stream_batch_size": 2
+        })
+        blk._min_tag_id = ["5"]
+        body = json.dumps({
+            "pagination": {"min_tag_id": "7"},
+            "data": [{"id": "1"}, {"id": "2"}, {"id": "3"}]
+        }).encode()
+        resp = Mock()
+        resp.iter_content.return_value = [body[:10], body[10:]]
+        with patch.object(blk, "notify_signals") as mock_notify:
+            signals, paging = blk._process_response(resp)
+        # the first batch is notified while the rest is being decoded
+        self.assertEqual(["1", "2"],
+                         [s.id for s in mock_notify.call_args[0][0]])
+        self.assertEqual(["3"], [s.id for s in signals])
+        self.assertFalse(paging)
+        self.assertEqual("7", blk.min_tag_id)
+
+    @patch.object(RESTPolling, "_retry")
+    @patch.object(RESTPolling, "_authenticate")
+    @patch("requests.get")
+    @patch("requests.Session.get")
+    def test_sequential_session(self, mock_session_get, mock_get, mock_auth,
+                                mock_retry):
+        blk = Instagram()
+        self.configure_block(blk, {
+            "queries": ["hashtag1"],
+            "concurrent_polling": False
+        })
+        blk._min_tag_id = ["5"]
+        resp = Mock(status_code=200, headers={})
+        resp.json.return_value = {
+            "pagination": {"min_tag_id": "7"}, "data": [{"id": "1"}]}
+        mock_session_get.return_value = resp
+        with patch.object(blk, "notify_signals") as mock_notify:
+            blk.poll()
+        # polled through the pooled session, not a bare requests.get
+        mock_get.assert_not_called()
+        self.assertIn("min_tag_id=5", mock_session_get.call_args[0][0])
+        self.assertEqual(["1"], [s.id for s in mock_notify.call_args[0][0]])
+        self.assertEqual("7", blk.min_tag_id)
+        resp.close.assert_called_once_with()
+
+    @patch.object(RESTPolling, "_retry")
+    @patch.object(RESTPolling, "_authenticate")
+    @patch("requests.Session.get")
+    def test_sequential_stream(self, mock_session_get, mock_auth, mock_retry):
+        blk = Instagram()
+        self.configure_block(blk, {
+            "queries": ["hashtag1"],
+            "concurrent_polling": False,
+            "stream_responses": True
+        })
+        blk._min_tag_id = ["5"]
+        body = json.dumps({
+            "pagination": {"min_tag_id": "7"}, "data": [{"id": "1"}]
+        }).encode()
+        resp = Mock(status_code=200, headers={})
+        resp.iter_content.return_value = [body]
+        mock_session_get.return_value = resp
+        with patch.object(blk, "notify_signals") as mock_notify:
+            blk.poll()
+        # the page is decoded as it is downloaded
+        self.assertTrue(mock_session_get.call_args[1]["stream"])
+        resp.json.assert_not_called()
+        self.assertEqual(["1"], [s.id for s in mock_notify.call_args[0][0]])
+        resp.close.assert_called_once_with()
+
+    @patch.object(RESTPolling, "_authenticate")
+    def test_signal_fields(self, mock_auth):
+        blk = Instagram()
+        self.configure_block(blk, {
+            "queries": ["hashtag1"],
+            "signal_fields": ["user.username", "link"],
+            "deduplication": {"enabled": True}
+        })
+        blk._min_tag_id = ["5"]
+        resp = Mock(status_code=200)
+        resp.content = json.dumps({
+            "pagination": {"min_tag_id": "7"},
+            "data": [
+                {"id": "1", "link": "url", "likes": {"data": [{}]},
+                 "user": {"username": "nio", "bio": "text"}},
+                {"id": "1", "link": "url", "user": {"username": "nio"}}
+            ]
+        }).encode()
+        signals, paging = blk._process_response(resp)
+        resp.json.assert_not_called()
+        # the id is decoded for deduplication, not notified
+        self.assertEqual(
+            [{"link": "url", "user": {"username": "nio"}}],
+            [s.to_dict() for s in signals])
+        self.assertEqual("7", blk.min_tag_id)
+
+    @patch.object(RESTPolling, "_authenticate")
+    def test_asyncio_backend(self, mock_auth):
+        blk = Instagram()
+        self.configure_block(blk, {
+            "queries": [
+                "hashtag1",
+                "hashtag2"
+            ],
+            "polling_backend": "asyncio"
+        })
+        blk._min_tag_id = ["5", "5"]
+        body = json.dumps({
+            "data": [{"id": "1"}],
+            "pagination": {"min_tag_id": "6"}
+        }).encode()
+        get_async = AsyncMock(return_value=AsyncResponse(200, {}, body))
+        with patch.object(AsyncPolling, "_open_async_session", AsyncMock()), \
+                patch.object(AsyncPolling, "_get_async", get_async), \
+                patch.object(blk, "notify_signals") as mock_notify:
+            blk._async_session = Mock(close=AsyncMock())
+            blk._start_event_loop()
+            blk.poll()
+            blk._async_cycle.result(2)
+            blk._stop_event_loop()
+        self.assertEqual(2, get_async.call_count)
+        self.assertEqual(1, mock_notify.call_count)
+        self.assertEqual(2, len(mock_notify.call_args[0][0]))
+        self.assertEqual(["6", "6"], blk._min_tag_id)
+
+    @patch.object(RESTPolling, "_authenticate")
+    def test_asyncio_initializes_off_the_loop(self, mock_auth):
+        blk = Instagram()
+        self.configure_block(blk, {
+            "queries": ["hashtag1"],
+            "polling_backend": "asyncio"
+        })
+        blk._min_tag_id = [None]
+        threads = []
+
+        def initialize():
+            threads.append(current_thread())
+            blk.min_tag_id = "5"
+
+        body = json.dumps({
+            "data": [], "pagination": {"min_tag_id": "5"}}).encode()
+        get_async = AsyncMock(return_value=AsyncResponse(200, {}, body))
+        with patch.object(AsyncPolling, "_open_async_session", AsyncMock()), \
+                patch.object(AsyncPolling, "_get_async", get_async), \
+                patch.object(blk, "_initialize_min_tag_id", initialize):
+            blk._async_session = Mock(close=AsyncMock())
+            blk._start_event_loop()
+            blk.poll()
+            blk._async_cycle.result(2)
+            loop_thread = blk._loop_thread
+            blk._stop_event_loop()
+        self.assertEqual(1, len(threads))
+        self.assertIsNot(loop_thread, threads[0])
+        self.assertIn("min_tag_id=5", get_async.call_args[0][0])
+
+    @patch.object(RESTPolling, "_retry")
+    @patch.object(RESTPolling, "_authenticate")
+    @patch("requests.Session.get")
+    def test_sequential_rate_limited(self, mock_get, mock_auth, mock_retry):
+        blk = Instagram()
+        self.configure_block(blk, {
+            "queries": ["hashtag1"],
+            "creds": {"client_id": "sequential_rate_limited"},
+            "rate_limit": {"enabled": True, "requests_per_hour": 100}
+        })
+        blk._min_tag_id = ["1"]
+        mock_get.return_value = Mock(status_code=429, headers={})
+        blk.poll()
+        self.assertLess(blk._budget.tokens, 1)
+
+    @patch.object(RESTPolling, "_retry")
+    @patch.object(RESTPolling, "_authenticate")
+    @patch("requests.Session.get")
+    def test_budget_updated_once(self, mock_get, mock_auth, mock_retry):
+        blk = Instagram()
+        self.configure_block(blk, {
+            "queries": ["hashtag1"],
+            "creds": {"client_id": "budget_updated_once"},
+            "rate_limit": {"enabled": True},
+            "concurrent_polling": True
+        })
+        blk._min_tag_id = ["1"]
+        mock_get.return_value = Mock(status_code=200, headers={
+            "X-Ratelimit-Remaining": "42"})
+        mock_get.return_value.json.return_value = {
+            "data": [], "pagination": {"min_tag_id": "1"}}
+        with patch.object(blk, "_update_budget") as mock_update:
+            blk.poll()
+        mock_update.assert_called_once_with(mock_get.return_value)
+
+    @patch.object(RESTPolling, "_retry")
+    @patch.object(RESTPolling, "_authenticate")
+    @patch("requests.Session.get")
+    def test_budget_exhausted(self, mock_get, mock_auth, mock_retry):
+        blk = Instagram()
+        self.configure_block(blk, {
+            "queries": ["hashtag1"],
+            "creds": {"client_id": "budget_exhausted"},
+            "polling_interval": {"seconds": 0.1},
+            "rate_limit": {"enabled": True, "requests_per_hour": 1}
+        })
+        blk._min_tag_id = ["1"]
+        blk._budget.update(remaining=0)
+        blk.poll()
+        # the poll is skipped once the wait expires, without a request
+        mock_get.assert_not_called()
+        self.assertEqual(
+            1, blk.metrics()["hashtag1"]["counters"]["skipped"])
+        self.assertFalse(blk._poll_lock.locked())
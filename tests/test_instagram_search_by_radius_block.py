@@ -0,0 +1,123 @@
+from unittest.mock import patch
+
+from nio.testing.block_test_case import NIOBlockTestCase
+from ..rest_polling.rest_block import RESTPolling
+
+from ..instagram_search_by_radius import InstagramSearchByRadius
+
+
+class TestInstagramSearchByRadius(NIOBlockTestCase):
+
+    @patch.object(RESTPolling, "_authenticate")
+    def test_merge_locations(self, mock_auth):
+        blk = InstagramSearchByRadius()
+        self.configure_block(blk, {
+            "merge_locations": True,
+            "queries": [
+                {"latitude": 40.7, "longitude": -74.0, "radius": 1000},
+                {"latitude": 40.7, "longitude": -73.99, "radius": 1000},
+                {"latitude": 34.0, "longitude": -118.2, "radius": 1000}
+            ]
+        })
+        self.assertEqual(2, len(blk._planned_queries))
+        self.assertEqual(2, blk._n_queries)
+        signals = blk._build_signals([
+            {"id": "1", "location": {"latitude": 40.7, "longitude": -74.005}},
+            {"id": "2", "location": {"latitude": 40.7, "longitude": -73.995}},
+            # in the merged circle but in neither location
+            {"id": "3", "location": {"latitude": 40.71, "longitude": -73.995}},
+            {"id": "4"}
+        ])
+        self.assertEqual(["1", "2"], [s.id for s in signals])
+        self.assertEqual(
+            ["lat=40.7&lng=-74.0&distance=1000"], signals[0].locations)
+        self.assertEqual(2, len(signals[1].locations))
+
+    @patch.object(RESTPolling, "_authenticate")
+    def test_separate_locations(self, mock_auth):
+        blk = InstagramSearchByRadius()
+        self.configure_block(blk, {
+            "queries": [
+                {"latitude": 40.7, "longitude": -74.0, "radius": 1000},
+                {"latitude": 40.7, "longitude": -73.99, "radius": 1000}
+            ]
+        })
+        self.assertEqual(["lat=40.7&lng=-74.0&distance=1000",
+                          "lat=40.7&lng=-73.99&distance=1000"],
+                         blk._planned_queries)
+        self.assertEqual(blk._planned_queries[0], blk.current_query)
+        # the configured locations are left as they are
+        self.assertEqual(-73.99, blk.queries()[1].longitude())
+
+    @patch.object(RESTPolling, "_authenticate")
+    def test_add_location(self, mock_auth):
+        blk = InstagramSearchByRadius()
+        self.configure_block(blk, {
+            "queries": [
+                {"latitude": 40.7, "longitude": -74.0, "radius": 1000}
+            ]
+        })
+        blk._freshest = [42]
+        self.assertEqual(["lat=40.7&lng=-74.0&distance=1000",
+                          "lat=34.0&lng=-118.2&distance=500"],
+                         blk.add_query("34.0,-118.2,500"))
+        self.assertEqual(2, blk._n_queries)
+        self.assertEqual(42, blk._freshest[0])
+        blk.remove_query("40.7,-74.0,1000")
+        self.assertEqual(["lat=34.0&lng=-118.2&distance=500"],
+                         blk._planned_queries)
+
+    @patch.object(RESTPolling, "_authenticate")
+    def test_geofences(self, mock_auth):
+        box = {"points": [{"latitude": 40.7, "longitude": -74.01},
+                          {"latitude": 40.71, "longitude": -74.0}]}
+        blk = InstagramSearchByRadius()
+        self.configure_block(blk, {
+            "queries": [
+                {"latitude": 40.7, "longitude": -74.0, "radius": 1000},
+                {"latitude": 34.0, "longitude": -118.2, "radius": 1000}
+            ],
+            "geofences": [
+                dict(box, query="lat=40.7&lng=-74.0&distance=1000")
+            ]
+        })
+        posts = [
+            {"id": "1", "location": {"latitude": 40.705,
+                                     "longitude": -74.005}},
+            {"id": "2", "location": {"latitude": 40.695,
+                                     "longitude": -74.005}},
+            {"id": "3"}
+        ]
+        self.assertEqual(["1"], [s.id for s in blk._build_signals(posts)])
+        # the second location has no geofence
+        blk._idx = 1
+        self.assertEqual(3, len(blk._build_signals(posts)))
+
+    @patch.object(RESTPolling, "_authenticate")
+    def test_merged_geofences(self, mock_auth):
+        blk = InstagramSearchByRadius()
+        self.configure_block(blk, {
+            "merge_locations": True,
+            "queries": [
+                {"latitude": 40.7, "longitude": -74.0, "radius": 1000},
+                {"latitude": 40.7, "longitude": -73.99, "radius": 1000}
+            ],
+            "geofences": [{
+                "query": "lat=40.7&lng=-74.0&distance=1000",
+                "points": [{"latitude": 40.7, "longitude": -74.01},
+                           {"latitude": 40.71, "longitude": -73.99}]
+            }]
+        })
+        signals = blk._build_signals([
+            {"id": "1", "location": {"latitude": 40.705,
+                                     "longitude": -73.995}},
+            {"id": "2", "location": {"latitude": 40.695,
+                                     "longitude": -73.995}},
+            {"id": "3", "location": {"latitude": 40.695,
+                                     "longitude": -74.005}}
+        ])
+        # posts are routed to a fenced location only inside its fence
+        self.assertEqual(["1", "2"], [s.id for s in signals])
+        self.assertEqual(2, len(signals[0].locations))
+        self.assertEqual(["lat=40.7&lng=-73.99&distance=1000"],
+                         signals[1].locations)
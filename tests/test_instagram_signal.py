@@ -0,0 +1,46 @@
+from unittest import TestCase
+
+from ..instagram_signal import InstagramSignal
+
+
+class TestInstagramSignal(TestCase):
+
+    def setUp(self):
+        self.post = {
+            "id": "1",
+            "type": "image",
+            "user": {"username": "nio"},
+            "images": {"thumbnail": {"url": "the_url"}}
+        }
+
+    def test_wraps_post(self):
+        signal = InstagramSignal(self.post)
+        self.assertEqual("1", signal.id)
+        self.assertIs(self.post["user"], signal.user)
+        self.assertFalse(hasattr(signal, "caption"))
+        self.assertEqual(self.post, signal.to_dict())
+
+    def test_fields(self):
+        signal = InstagramSignal(self.post, frozenset(["id", "user"]))
+        self.assertEqual("1", signal.id)
+        self.assertFalse(hasattr(signal, "images"))
+        self.assertEqual({"id": "1", "user": {"username": "nio"}},
+                         signal.to_dict())
+
+    def test_set_attributes(self):
+        signal = InstagramSignal(self.post)
+        signal.query = "nio"
+        signal.type = "video"
+        self.assertEqual("video", signal.type)
+        self.assertEqual("nio", signal.to_dict()["query"])
+        self.assertEqual("video", signal.to_dict()["type"])
+        # the wrapped post is never modified
+        self.assertEqual("image", self.post["type"])
+
+    def test_to_dict_options(self):
+        signal = InstagramSignal(self.post, frozenset(["id"]))
+        signal._hidden = True
+        self.assertEqual({"id": "1", "_hidden": True},
+                         signal.to_dict(include_hidden=True))
+        self.assertEqual({"id": "1", "signal_type": "InstagramSignal"},
+                         signal.to_dict(with_type="signal_type"))
@@ -0,0 +1,92 @@
+import json
+from unittest import TestCase
+
+from ..json_stream import FieldProjection, MediaStream
+
+
+def _chunks(data, size):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+class TestMediaStream(TestCase):
+
+    def setUp(self):
+        self.response = {
+            "pagination": {"next_url": "the_url", "min_tag_id": "123"},
+            "meta": {"code": 200},
+            "data": [
+                {"id": "1", "caption": {"text": "café ☕"}},
+                {"id": "2", "likes": {"count": 12345}},
+                {"id": "3", "tags": []}
+            ],
+            "count": 3
+        }
+        self.body = json.dumps(self.response).encode()
+
+    def test_streams_posts(self):
+        for size in (1, 3, 7, 1024):
+            stream = MediaStream(_chunks(self.body, size))
+            self.assertEqual(self.response["data"], list(stream))
+            self.assertEqual(self.response["pagination"],
+                             stream.fields["pagination"])
+            self.assertEqual(3, stream.fields["count"])
+
+    def test_batches(self):
+        stream = MediaStream(_chunks(self.body, 5))
+        batches = list(stream.batches(2))
+        self.assertEqual([["1", "2"], ["3"]],
+                         [[p["id"] for p in b] for b in batches])
+        self.assertEqual({"code": 200}, stream.fields["meta"])
+
+    def test_empty(self):
+        self.assertEqual([], list(MediaStream([b'{"data": []}'])))
+        self.assertEqual([], list(MediaStream([b' {} '])))
+
+    def test_truncated(self):
+        with self.assertRaises(ValueError):
+            list(MediaStream(_chunks(self.body[:-20], 4)))
+
+
+class TestFieldProjection(TestCase):
+
+    def setUp(self):
+        self.post = {
+            "id": "1",
+            "user": {"username": "nio", "bio": "text \\\" {[ brackets"},
+            "images": {
+                "thumbnail": {"url": "small \\\" ]}", "width": 150},
+                "standard_resolution": {"url": "big", "width": 640}
+            },
+            "comments": {"count": 2, "data": [{"text": "a"},
+                                              {"text": "b }"}]},
+            "users_in_photo": [{"user": {"username": "a", "id": "9"}},
+                               {"user": {"username": "b", "id": "8"}}],
+            "tags": ["x", "y"]
+        }
+        self.body = json.dumps({"data": [self.post, self.post],
+                                "pagination": {}}).encode()
+
+    def test_tree(self):
+        projection = FieldProjection(
+            ["user.username", "images", "images.thumbnail.url"], ["id"])
+        self.assertEqual(frozenset(["user", "images"]), projection.fields)
+        self.assertEqual({"user": {"username": None}, "images": None,
+                          "id": None}, projection.tree)
+
+    def test_projected_posts(self):
+        projection = FieldProjection(
+            ["user.username", "images.standard_resolution.url",
+             "comments.count", "users_in_photo.user.username", "tags"])
+        expected = {
+            "user": {"username": "nio"},
+            "images": {"standard_resolution": {"url": "big"}},
+            "comments": {"count": 2},
+            "users_in_photo": [{"user": {"username": "a"}},
+                               {"user": {"username": "b"}}],
+            "tags": ["x", "y"]
+        }
+        for size in (1, 3, 7, 1024):
+            stream = MediaStream(_chunks(self.body, size),
+                                 projection=projection)
+            self.assertEqual([expected, expected], list(stream))
+            self.assertEqual({}, stream.fields["pagination"])
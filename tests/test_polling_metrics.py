@@ -0,0 +1,32 @@
+from unittest import TestCase
+
+from ..polling_metrics import LatencyHistogram, PollingMetrics
+
+
+class TestPollingMetrics(TestCase):
+
+    def test_histogram(self):
+        histogram = LatencyHistogram()
+        self.assertIsNone(histogram.percentile(0.5))
+        for _ in range(98):
+            histogram.observe(0.003)
+        histogram.observe(0.15)
+        histogram.observe(90)
+        stats = histogram.to_dict()
+        self.assertEqual(100, stats['count'])
+        self.assertEqual(5, stats['p50_ms'])
+        self.assertEqual(200, stats['p99_ms'])
+        self.assertEqual(90000, stats['max_ms'])
+        self.assertEqual(90000, histogram.percentile(1))
+
+    def test_snapshot(self):
+        metrics = PollingMetrics()
+        metrics.query('a').count('polls')
+        metrics.query('a').count('polls')
+        metrics.query('b').observe('request', 0.01)
+        metrics.query('b').cursor_advanced_at = 10
+        snapshot = metrics.snapshot(now=25)
+        self.assertEqual({'polls': 2}, snapshot['a']['counters'])
+        self.assertIsNone(snapshot['a']['cursor_age'])
+        self.assertEqual(1, snapshot['b']['latency']['request']['count'])
+        self.assertEqual(15, snapshot['b']['cursor_age'])
@@ -0,0 +1,48 @@
+from collections import Counter
+from unittest import TestCase
+
+from ..query_priority import CircuitBreaker, PriorityScheduler
+
+
+class TestPriorityScheduler(TestCase):
+
+    def test_pick(self):
+        scheduler = PriorityScheduler([5, 1, 1])
+        picks = [scheduler.pick([0, 1, 2]) for _ in range(70)]
+        self.assertEqual({0: 50, 1: 10, 2: 10}, Counter(picks))
+        # the light queries are never more than 7 picks apart
+        for idx in (1, 2):
+            positions = [n for n, pick in enumerate(picks) if pick == idx]
+            self.assertTrue(all(b - a <= 7 for a, b in
+                                zip(positions, positions[1:])))
+
+    def test_pick_ready(self):
+        scheduler = PriorityScheduler([5, 1])
+        self.assertEqual([1, 1], [scheduler.pick([1]) for _ in range(2)])
+
+    def test_cycle(self):
+        scheduler = PriorityScheduler([4, 2, 1])
+        cycles = [scheduler.cycle([0, 1, 2]) for _ in range(4)]
+        self.assertEqual([[0], [0, 1], [0], [0, 1, 2]], cycles)
+
+
+class TestCircuitBreaker(TestCase):
+
+    def test_backoff(self):
+        breaker = CircuitBreaker(2, threshold=2, min_backoff=10,
+                                 max_backoff=25)
+        self.assertEqual(0, breaker.failure(0, now=0))
+        self.assertTrue(breaker.allows(0, now=0))
+        self.assertEqual(10, breaker.failure(0, now=0))
+        self.assertFalse(breaker.allows(0, now=5))
+        self.assertTrue(breaker.allows(0, now=10))
+        self.assertTrue(breaker.allows(1, now=5))
+        self.assertEqual(20, breaker.failure(0, now=10))
+        self.assertEqual(25, breaker.failure(0, now=30))
+
+    def test_success(self):
+        breaker = CircuitBreaker(1, threshold=1, min_backoff=10)
+        breaker.failure(0, now=0)
+        breaker.success(0)
+        self.assertTrue(breaker.allows(0, now=1))
+        self.assertEqual(10, breaker.failure(0, now=1))
@@ -0,0 +1,53 @@
+from unittest import TestCase
+
+from ..radius_tiling import Circle, LocationIndex, distance, \
+    enclosing_circle, plan_tiles
+
+
+class TestRadiusTiling(TestCase):
+
+    def test_distance(self):
+        # One degree of latitude is about 111km
+        self.assertAlmostEqual(111195, distance(0, 0, 1, 0), delta=1)
+        self.assertAlmostEqual(
+            distance(0, 179.9, 0, -179.9), distance(0, 0, 0, 0.2))
+
+    def test_enclosing_circle(self):
+        a = Circle(0, 0, 1000)
+        b = Circle(0, 0.01, 500)
+        merged = enclosing_circle(a, b)
+        self.assertTrue(merged.covers(Circle(0, 0, 999)))
+        self.assertTrue(merged.covers(Circle(0, 0.01, 499)))
+        self.assertEqual(a, enclosing_circle(a, Circle(0, 0.001, 100)))
+
+    def test_plan_tiles(self):
+        circles = [
+            Circle(40.7, -74.0, 1000),
+            Circle(40.7, -73.99, 1000),
+            # nested in the first circle
+            Circle(40.7, -74.0, 100),
+            # far away
+            Circle(34.0, -118.2, 1000),
+        ]
+        tiles = sorted(plan_tiles(circles, 5000), key=lambda t: t[1])
+        self.assertEqual([[0, 1, 2], [3]], [members for _, members in tiles])
+        merged, members = tiles[0]
+        self.assertLessEqual(merged.radius, 5000)
+        for idx in members:
+            self.assertTrue(merged.covers(
+                circles[idx]._replace(radius=circles[idx].radius - 1)))
+        self.assertEqual(circles[3], tiles[1][0])
+
+    def test_max_radius(self):
+        circles = [Circle(0, 0, 3000), Circle(0, 0.05, 3000)]
+        self.assertEqual(2, len(plan_tiles(circles, 5000)))
+        self.assertEqual(1, len(plan_tiles(circles, 6000)))
+
+    def test_location_index(self):
+        circles = [Circle(40.7, -74.0, 1000), Circle(40.7, -73.99, 1000),
+                   Circle(34.0, -118.2, 1000)]
+        index = LocationIndex(circles)
+        self.assertEqual([0], index.locate(40.7, -74.005))
+        self.assertEqual([0, 1], index.locate(40.7, -73.995))
+        self.assertEqual([2], index.locate(34.005, -118.2))
+        self.assertEqual([], index.locate(40.8, -74.0))
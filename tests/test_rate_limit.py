@@ -0,0 +1,67 @@
+from unittest import TestCase
+from unittest.mock import Mock
+
+from ..rate_limit import RequestBudget, RateLimitBudget, get_budget
+
+
+class TestRequestBudget(TestCase):
+
+    def test_acquire(self):
+        budget = RequestBudget(limit=2, period=3600)
+        self.assertTrue(budget.acquire(timeout=0))
+        self.assertTrue(budget.acquire(timeout=0))
+        self.assertFalse(budget.acquire(timeout=0))
+
+    def test_refill(self):
+        budget = RequestBudget(limit=100, period=1)
+        budget.update(remaining=0)
+        # 100 tokens per second, one is back within 10ms
+        self.assertTrue(budget.acquire(timeout=0.1))
+
+    def test_paging_reserve(self):
+        budget = RequestBudget(limit=10, period=3600, paging_reserve=0.5)
+        budget.update(remaining=6)
+        self.assertTrue(budget.allows_paging())
+        self.assertTrue(budget.acquire(paging=True, timeout=0))
+        self.assertFalse(budget.allows_paging())
+        self.assertFalse(budget.acquire(paging=True, timeout=0))
+        # new queries can still spend the reserve
+        self.assertTrue(budget.acquire(timeout=0))
+
+    def test_update_recovers(self):
+        budget = RequestBudget(limit=10, period=3600)
+        budget.update(remaining=2)
+        budget.update(remaining=8)
+        self.assertAlmostEqual(8, budget.tokens, places=0)
+        # never above the limit
+        budget.update(remaining=20)
+        self.assertAlmostEqual(10, budget.tokens, places=0)
+
+    def test_shared_by_client_id(self):
+        self.assertIs(get_budget("client"), get_budget("client"))
+        self.assertIsNot(get_budget("client"), get_budget("other"))
+
+    def test_other_settings(self):
+        budget = get_budget("settings", 100, 0.2)
+        self.assertIs(budget, get_budget("settings", 100, 0.2))
+        # other settings do not change the shared budget
+        other = get_budget("settings", 10, 0.5)
+        self.assertIsNot(budget, other)
+        self.assertEqual(100, budget.limit)
+        self.assertEqual(0.2, budget.paging_reserve)
+        self.assertEqual(10, other.limit)
+        self.assertEqual(0.5, other.paging_reserve)
+
+
+class TestRateLimitBudget(TestCase):
+
+    def test_update_from_headers(self):
+        mixin = RateLimitBudget()
+        mixin._budget = RequestBudget(limit=5000)
+        resp = Mock(status_code=200, headers={
+            "X-Ratelimit-Remaining": "42", "X-Ratelimit-Limit": "500"})
+        mixin._update_budget(resp)
+        self.assertEqual(500, mixin._budget.limit)
+        self.assertAlmostEqual(42, mixin._budget.tokens, places=0)
+        mixin._update_budget(Mock(status_code=429, headers={}))
+        self.assertLess(mixin._budget.tokens, 1)
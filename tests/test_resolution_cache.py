@@ -0,0 +1,70 @@
+import os
+import tempfile
+from unittest import TestCase
+from unittest.mock import patch
+
+from ..resolution_cache import ResolutionCache, get_cache, reset_caches
+
+
+class TestResolutionCache(TestCase):
+
+    def setUp(self):
+        super().setUp()
+        reset_caches()
+
+    def test_get_set(self):
+        cache = ResolutionCache()
+        self.assertIsNone(cache.get("user1"))
+        cache.set("user1", "123")
+        self.assertEqual("123", cache.get("user1"))
+
+    @patch("{}.time".format(ResolutionCache.__module__))
+    def test_ttl(self, mock_time):
+        cache = ResolutionCache(ttl=10)
+        mock_time.return_value = 100
+        cache.set("user1", "123")
+        mock_time.return_value = 110
+        self.assertEqual("123", cache.get("user1"))
+        mock_time.return_value = 111
+        self.assertIsNone(cache.get("user1"))
+        self.assertEqual(0, len(cache))
+
+    def test_evicts_least_recently_used(self):
+        cache = ResolutionCache(max_size=2)
+        cache.set("user1", "1")
+        cache.set("user2", "2")
+        cache.get("user1")
+        cache.set("user3", "3")
+        self.assertEqual("1", cache.get("user1"))
+        self.assertIsNone(cache.get("user2"))
+        self.assertEqual("3", cache.get("user3"))
+
+    def test_file_backed(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "ids.json")
+            cache = ResolutionCache(path)
+            cache.set("user1", "123")
+            cache.save()
+            self.assertEqual("123", ResolutionCache(path).get("user1"))
+            with open(path, "w") as f:
+                f.write("not json")
+            self.assertEqual(0, len(ResolutionCache(path)))
+
+    def test_unusable_file(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "ids.json")
+            # valid json of the wrong shape
+            for content in ('[["user1", 5]]', '[["user1", ["1", "x"]]]',
+                            '{"user1": "1"}'):
+                with open(path, "w") as f:
+                    f.write(content)
+                self.assertEqual(0, len(ResolutionCache(path)))
+            # a directory can not be read
+            self.assertEqual(0, len(ResolutionCache(tmp)))
+
+    def test_shared_by_path(self):
+        cache = get_cache("", ttl=10, max_size=5)
+        self.assertIs(cache, get_cache(None, ttl=20, max_size=5))
+        self.assertEqual(20, cache.ttl)
+        reset_caches()
+        self.assertIsNot(cache, get_cache())
@@ -0,0 +1,42 @@
+from datetime import timedelta
+from threading import Event
+from unittest.mock import Mock
+
+from nio.testing.block_test_case import NIOBlockTestCase
+
+from ..signal_batching import SignalBatcher
+
+
+class TestSignalBatcher(NIOBlockTestCase):
+
+    def test_max_size(self):
+        notify = Mock()
+        batcher = SignalBatcher(notify, 3, timedelta(seconds=60))
+        batcher.add([1, 2])
+        notify.assert_not_called()
+        batcher.add([3, 4, 5, 6, 7])
+        self.assertEqual([[1, 2, 3], [4, 5, 6]],
+                         [c[0][0] for c in notify.call_args_list])
+        batcher.flush()
+        self.assertEqual([7], notify.call_args[0][0])
+        batcher.flush()
+        self.assertEqual(3, notify.call_count)
+
+    def test_outputs(self):
+        notify = Mock()
+        batcher = SignalBatcher(notify, 10, timedelta(seconds=60))
+        batcher.add([1], "a")
+        batcher.add([2], "b")
+        batcher.add([3], "a")
+        batcher.flush()
+        self.assertCountEqual([(([1, 3], "a"),), (([2], "b"),)],
+                              notify.call_args_list)
+
+    def test_max_latency(self):
+        flushed = Event()
+        notify = Mock(side_effect=lambda *args: flushed.set())
+        batcher = SignalBatcher(notify, 10, timedelta(milliseconds=50))
+        batcher.add([1])
+        batcher.add([2])
+        self.assertTrue(flushed.wait(1))
+        notify.assert_called_once_with([1, 2], None)
@@ -0,0 +1,53 @@
+from threading import Thread
+from unittest import TestCase
+
+from ..signal_queue import SignalQueue, QueuePolicy
+
+
+class TestSignalQueue(TestCase):
+
+    def test_pause_paging(self):
+        queue = SignalQueue(3)
+        queue.put([1, 2])
+        self.assertFalse(queue.full)
+        # accepted past capacity, pollers stop paging instead
+        queue.put([3, 4], "out")
+        self.assertTrue(queue.full)
+        self.assertEqual(([1, 2], None), queue.get())
+        self.assertEqual(([3, 4], "out"), queue.get())
+        self.assertFalse(queue.full)
+        self.assertEqual({"depth": 0, "max_depth": 4, "capacity": 3,
+                          "dropped": 0, "blocked_seconds": 0.0},
+                         queue.stats())
+
+    def test_drop_oldest(self):
+        queue = SignalQueue(3, QueuePolicy.drop_oldest)
+        queue.put([1, 2])
+        queue.put([3, 4])
+        self.assertEqual(([2], None), queue.get())
+        self.assertEqual(([3, 4], None), queue.get())
+        queue.put([5, 6, 7, 8])
+        self.assertEqual(([6, 7, 8], None), queue.get())
+        self.assertEqual(2, queue.stats()["dropped"])
+        self.assertEqual(3, queue.stats()["max_depth"])
+
+    def test_block(self):
+        queue = SignalQueue(2, QueuePolicy.block)
+        queue.put([1, 2])
+        producer = Thread(target=queue.put, args=([3],))
+        producer.start()
+        producer.join(0.05)
+        self.assertTrue(producer.is_alive())
+        self.assertEqual(([1, 2], None), queue.get())
+        producer.join(1)
+        self.assertFalse(producer.is_alive())
+        self.assertEqual(([3], None), queue.get())
+        self.assertGreater(queue.stats()["blocked_seconds"], 0)
+
+    def test_close(self):
+        queue = SignalQueue(2)
+        queue.put([1])
+        queue.close()
+        # queued signals are still taken once closed
+        self.assertEqual(([1], None), queue.get())
+        self.assertIsNone(queue.get())
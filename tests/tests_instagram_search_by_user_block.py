@@ -1,3 +1,5 @@
+from time import time
+
 from requests import Response
 from unittest.mock import patch, Mock
 
@@ -5,14 +7,24 @@ from nio.testing.block_test_case import NIOBlockTestCase
 from ..rest_polling.rest_block import RESTPolling
 
 from ..instagram_search_by_user_block import InstagramSearchByUser
+from ..resolution_cache import get_cache, reset_caches
 
 
 class TestInstagramSearchByUser(NIOBlockTestCase):
+
+    def setUp(self):
+        super().setUp()
+        # resolutions cached by other tests must not leak into these
+        reset_caches()
+
     @patch.object(RESTPolling, "_retry")
     @patch.object(RESTPolling, "_authenticate")
     @patch.object(InstagramSearchByUser, "_extract_resource_id")
-    @patch("requests.get")
-    def test_private_user(self, mock_get, mock_id, mock_auth, mock_retry):
+    @patch("requests.Session.get")
+    def test_private_user(self, mock_get, mock_id, mock_auth,
+                          mock_retry):
+        get_cache().set("InstagramSearchByUser:user1", "1")
+        get_cache().set("InstagramSearchByUser:user2", "2")
         blk = InstagramSearchByUser()
         self.configure_block(blk, {
             "queries": [
@@ -20,10 +32,11 @@ class TestInstagramSearchByUser(NIOBlockTestCase):
                 "user2"
             ]
         })
-        blk.queries = ['1', '2']
-        blk._n_queries = len(blk.queries())
+        blk._planned_queries = ['1', '2']
+        blk._n_queries = len(blk._planned_queries)
         resp = Response()
         resp.status_code = 400
+        resp.raw = Mock()
         resp.json = Mock()
         resp.json.return_value = \
             {
@@ -43,8 +56,11 @@ class TestInstagramSearchByUser(NIOBlockTestCase):
     @patch.object(RESTPolling, "_retry")
     @patch.object(RESTPolling, "_authenticate")
     @patch.object(InstagramSearchByUser, "_extract_resource_id")
-    @patch("requests.get")
-    def test_retry(self, mock_get, mock_id, mock_auth, mock_retry):
+    @patch("requests.Session.get")
+    def test_retry(self, mock_get, mock_id, mock_auth,
+                   mock_retry):
+        get_cache().set("InstagramSearchByUser:user1", "1")
+        get_cache().set("InstagramSearchByUser:user2", "2")
         blk = InstagramSearchByUser()
         self.configure_block(blk, {
             "queries": [
@@ -52,10 +68,11 @@ class TestInstagramSearchByUser(NIOBlockTestCase):
                 "user2"
             ]
         })
-        blk.queries = ['1', '2']
-        blk._n_queries = len(blk.queries())
+        blk._planned_queries = ['1', '2']
+        blk._n_queries = len(blk._planned_queries)
         resp = Response()
         resp.status_code = 400
+        resp.raw = Mock()
         resp.json = Mock()
         resp.json.return_value = \
             {
@@ -71,3 +88,189 @@ class TestInstagramSearchByUser(NIOBlockTestCase):
         blk.poll(paging)
         # don't skip to next idx because we are retrying.
         self.assertEqual(0, blk._idx)
+
+    @patch("requests.Session.get")
+    @patch.object(RESTPolling, "_authenticate")
+    def test_cached_ids(self, mock_auth, mock_session_get):
+        resp = Response()
+        resp.status_code = 200
+        resp.json = Mock(return_value={
+            "data": [{"username": "User2", "id": "2"}]
+        })
+        mock_session_get.return_value = resp
+        get_cache().set("InstagramSearchByUser:user1", "1")
+        blk = InstagramSearchByUser()
+        self.configure_block(blk, {
+            "queries": [
+                "user1",
+                "User2"
+            ]
+        })
+        # only the cache miss is looked up
+        self.assertEqual(1, mock_session_get.call_count)
+        self.assertEqual(["1", "2"], blk._planned_queries)
+        self.assertEqual("2", get_cache().get("InstagramSearchByUser:user2"))
+
+    @patch.object(RESTPolling, "_authenticate")
+    def test_cursors(self, mock_auth):
+        get_cache().set("InstagramSearchByUser:user1", "1")
+        get_cache().set("InstagramSearchByUser:user2", "2")
+        now = int(time())
+        blk = InstagramSearchByUser()
+        blk._cursors = {"1": {"_freshest": now}, "2": {"_freshest": 0}}
+        self.configure_block(blk, {
+            "queries": [
+                "user1",
+                "user2"
+            ]
+        })
+        # user1 resumes from its cursor, user2's is older than the lookback
+        self.assertEqual(now, blk._freshest[0])
+        self.assertAlmostEqual(now - 300, blk._freshest[1], delta=1)
+        self.assertEqual({"_freshest": now}, blk._cursors["1"])
+        self.assertEqual(blk._freshest[1], blk._cursors["2"]["_freshest"])
+
+    @patch.object(RESTPolling, "_retry")
+    @patch.object(RESTPolling, "_authenticate")
+    @patch("requests.Session.get")
+    def test_circuit_breaker(self, mock_get, mock_auth, mock_retry):
+        get_cache().set("InstagramSearchByUser:user1", "1")
+        get_cache().set("InstagramSearchByUser:user2", "2")
+        blk = InstagramSearchByUser()
+        self.configure_block(blk, {
+            "queries": [
+                "user1",
+                "user2"
+            ],
+            "circuit_breaker": {"enabled": True, "failure_threshold": 2}
+        })
+        resp = Response()
+        resp.status_code = 500
+        resp.raw = Mock()
+        resp.json = Mock(return_value={'meta': {'code': 500}})
+        mock_get.return_value = resp
+        blk.poll()
+        # retried, the first failure does not bench user1
+        self.assertEqual(1, mock_retry.call_count)
+        self.assertTrue(blk._query_ready(0))
+        blk.poll(in_retry=True)
+        # benched, move on to user2 without retrying
+        self.assertEqual(1, mock_retry.call_count)
+        self.assertFalse(blk._query_ready(0))
+        self.assertEqual(1, blk._idx)
+        blk.poll()
+        self.assertEqual(1, blk._idx)
+        self.assertIn("/users/2/", mock_get.call_args[0][0])
+
+    @patch.object(RESTPolling, "_authenticate")
+    def test_query_priorities(self, mock_auth):
+        for user in ("vip", "user2", "user3"):
+            get_cache().set("InstagramSearchByUser:" + user, user)
+        blk = InstagramSearchByUser()
+        self.configure_block(blk, {
+            "queries": ["VIP", "user2", "user3"],
+            "query_priorities": [{"query": "vip", "weight": 2}],
+            "concurrent_polling": True
+        })
+        polled = [blk._queries_to_poll() for _ in range(2)]
+        self.assertEqual([[0], [0, 1, 2]], polled)
+
+    @patch("requests.Session.get")
+    @patch.object(RESTPolling, "_authenticate")
+    def test_update_queries(self, mock_auth, mock_session_get):
+        resp = Response()
+        resp.status_code = 200
+        resp.json = Mock(return_value={
+            "data": [{"username": "user4", "id": "4"}]
+        })
+        mock_session_get.return_value = resp
+        get_cache().set("InstagramSearchByUser:user1", "1")
+        get_cache().set("InstagramSearchByUser:user2", "2")
+        blk = InstagramSearchByUser()
+        self.configure_block(blk, {
+            "queries": [
+                "user1",
+                "user2"
+            ],
+            "circuit_breaker": {"enabled": True, "failure_threshold": 1}
+        })
+        now = int(time())
+        blk._freshest = [now - 10, now - 20]
+        blk._circuit_breaker().failure(1)
+        self.assertEqual(["user1", "user2", "user4"],
+                         blk.add_query("user4"))
+        # only the added user is resolved and starts from the lookback
+        self.assertEqual(1, mock_session_get.call_count)
+        self.assertEqual(["1", "2", "4"], blk._planned_queries)
+        self.assertEqual([now - 10, now - 20], blk._freshest[:2])
+        self.assertAlmostEqual(now - 300, blk._freshest[2], delta=1)
+        self.assertEqual(["user2", "user4"], blk.remove_query("USER1"))
+        self.assertEqual(["2", "4"], blk._planned_queries)
+        self.assertEqual(now - 20, blk._freshest[0])
+        # user2 stays benched
+        self.assertFalse(blk._query_ready(0))
+        self.assertTrue(blk._query_ready(1))
+        # user1 comes back with its cursor
+        blk.add_query("user1")
+        self.assertEqual(["2", "4", "1"], blk._planned_queries)
+        self.assertEqual(now - 10, blk._freshest[2])
+        self.assertEqual(1, mock_session_get.call_count)
+
+    @patch("requests.Session.get")
+    @patch.object(RESTPolling, "_authenticate")
+    def test_background_warm_up(self, mock_auth, mock_session_get):
+        resp = Response()
+        resp.status_code = 200
+        resp.json = Mock(return_value={
+            "data": [{"username": "user5", "id": "5"}]
+        })
+        mock_session_get.return_value = resp
+        get_cache().set("InstagramSearchByUser:user1", "1")
+        now = int(time())
+        blk = InstagramSearchByUser()
+        blk._cursors = {"1": {"_freshest": now}, "3": {"_freshest": now}}
+        self.configure_block(blk, {
+            "queries": [
+                "user1",
+                "user5"
+            ],
+            "background_warm_up": True
+        })
+        # nothing is resolved or polled until the block starts
+        mock_session_get.assert_not_called()
+        self.assertEqual([], blk._planned_queries)
+        blk.poll()
+        self.assertEqual({"1": {"_freshest": now}, "3": {"_freshest": now}},
+                         blk._cursors)
+        blk.start()
+        blk._warm_up_thread.join(1)
+        self.assertEqual(1, mock_session_get.call_count)
+        self.assertEqual(["1", "5"], blk._planned_queries)
+        self.assertEqual(now, blk._freshest[0])
+        self.assertAlmostEqual(now - 300, blk._freshest[1], delta=1)
+        self.assertEqual(["1", "5"], sorted(blk._cursors))
+        blk.stop()
+
+    @patch.object(RESTPolling, "_retry")
+    @patch.object(RESTPolling, "_authenticate")
+    @patch("requests.Session.get")
+    def test_client_id_pool(self, mock_get, mock_auth, mock_retry):
+        get_cache().set("InstagramSearchByUser:user1", "1")
+        blk = InstagramSearchByUser()
+        self.configure_block(blk, {
+            "queries": ["user1"],
+            "client_id": "key1",
+            "client_id_pool": ["key2"],
+            "concurrent_polling": True
+        })
+        resp = Response()
+        resp.status_code = 429
+        resp.json = Mock(return_value={'meta': {'code': 429}})
+        mock_get.return_value = resp
+        blk.poll()
+        first = mock_get.call_args[0][0]
+        blk.poll()
+        second = mock_get.call_args[0][0]
+        # the rate limited client id is left out on the next poll
+        self.assertEqual({"client_id=key1", "client_id=key2"},
+                         {first.split("&")[1], second.split("&")[1]})